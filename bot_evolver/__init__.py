@@ -0,0 +1,3 @@
+# Bots that talk to each other through a shared Conversation. Run from the
+# repository root, so the shared completion_client is importable:
+# python -m bot_evolver.app
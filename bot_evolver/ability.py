@@ -1,5 +1,5 @@
 import datetime
-from utils import setup_logger
+from .utils import setup_logger
 
 class Ability:
     def __init__(self, name, action, requirements=None):
@@ -1,5 +1,5 @@
-from bot import Bot
-from conversation import Conversation
+from .bot import Bot
+from .conversation import Conversation
 import os
 from dotenv import load_dotenv
 
@@ -1,7 +1,7 @@
 import threading
 import uuid
-from memory import Memory
-from ability import Ability
+from .memory import Memory
+from .ability import Ability
 import logging
 import datetime
 import openai
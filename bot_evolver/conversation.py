@@ -1,17 +1,21 @@
 # Description: Conversation class for storing conversation history and generating responses
-from utils import setup_logger
+from .utils import setup_logger
 import uuid
 import openai
 import logging
 
+# The completion layer lives in the repository root, shared with the Discord bot
+from completion_client import create_chat_completion
+
 class Conversation:
-    def __init__(self, api_key, model="gpt-3.5-turbo", max_exchange=None, id=None):
+    def __init__(self, api_key, model="gpt-3.5-turbo", max_exchange=None, id=None, cache=None):
         if id:
             self.id = id
         else:
             self.id = str(uuid.uuid4())
         self.api_key = api_key
         self.model = model
+        self.cache = cache  # Optional completion_client.ResponseCache
         self.messages = []
         self.bots = []
         self.setup_logger()
@@ -73,9 +77,10 @@ class Conversation:
         # convert conversation to OpenAI format
         messages_formatted = [{'role': message['role'], 'content': message['content']} for message in messages]
 
-        response = openai.ChatCompletion.create(
+        response = create_chat_completion(
+            messages_formatted,
             model=model,
-            messages=messages_formatted,
+            cache=self.cache,
             max_tokens=150
         )
 
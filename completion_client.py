@@ -0,0 +1,286 @@
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import logging
+from collections import deque, OrderedDict
+
+import openai
+
+# Completion layer shared by the Discord bot and bot_evolver. The async client
+# queues requests per guild and serves them round-robin from a fixed pool of
+# worker tasks, so one busy server can't starve the others and a slow
+# completion never blocks the discord.py event loop. Both paths can share an
+# optional ResponseCache.
+
+class CompletionQueueFullError(Exception):
+    pass
+
+_STREAM_END = object()
+
+
+class ResponseCache:
+    """Opt-in cache of completion responses keyed on the trimmed context.
+
+    Entries expire after ttl seconds and the in-memory tier keeps at most
+    max_entries, evicting the least recently used. With a path, responses
+    are also written through to a SQLite file so the cache survives restarts.
+    Expired rows are deleted from the file at most every prune_interval
+    seconds, as responses are written.
+    """
+
+    def __init__(self, ttl=3600, max_entries=1024, path=None, prune_interval=300):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.prune_interval = prune_interval
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (expires_at, response)
+        self._db = None
+        self._pruned_at = 0.0
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute('CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, expires_at REAL NOT NULL, response TEXT NOT NULL)')
+            self._prune(time.time())
+            self._db.commit()
+
+    @staticmethod
+    def make_key(messages, model, **params):
+        # Whitespace differences shouldn't make "hi" and " hi " separate entries. Case can change the answer
+        normalized = [(m['role'], ' '.join(m['content'].split())) for m in messages]
+        payload = json.dumps([model, normalized, sorted(params.items())])
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] < now:
+            del self._entries[key]
+            entry = None
+
+        if entry is None and self._db is not None:
+            row = self._db.execute('SELECT expires_at, response FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is not None and row[0] >= now:
+                entry = (row[0], json.loads(row[1]))
+                self._store(key, entry)
+
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key, response):
+        now = time.time()
+        entry = (now + self.ttl, response)
+        self._store(key, entry)
+        if self._db is not None:
+            self._db.execute('INSERT OR REPLACE INTO responses (key, expires_at, response) VALUES (?, ?, ?)',
+                             (key, entry[0], json.dumps(response)))
+            if now - self._pruned_at >= self.prune_interval:
+                self._prune(now)
+            self._db.commit()
+
+    def _prune(self, now):
+        # Keeps a long-running bot's cache file from growing without bound
+        self._db.execute('DELETE FROM responses WHERE expires_at < ?', (now,))
+        self._pruned_at = now
+
+    def _store(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'entries': len(self._entries),
+        }
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+
+
+def create_chat_completion(messages, model="gpt-3.5-turbo", cache=None, **kwargs):
+    # Blocking completion call for code that doesn't run on an event loop
+    key = cache.make_key(messages, model, **kwargs) if cache else None
+    if key:
+        response = cache.get(key)
+        if response is not None:
+            return response
+
+    response = openai.ChatCompletion.create(model=model, messages=messages, **kwargs)
+
+    if key:
+        cache.set(key, response)
+    return response
+
+
+class AsyncCompletionClient:
+    def __init__(self, model="gpt-3.5-turbo", max_workers=4, timeout=60, max_pending_per_guild=20, cache=None):
+        self.model = model
+        self.cache = cache
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.max_pending_per_guild = max_pending_per_guild
+        self._pending = {}  # guild_id -> deque of (call, future, deadline)
+        self._guilds = deque()  # round-robin order of guilds with pending requests
+        self._available = None
+        self._workers = []
+
+    def start(self):
+        # Must be called from inside the running event loop
+        if self._workers:
+            return
+        self._available = asyncio.Semaphore(0)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.max_workers)]
+        logging.info(f'Started {self.max_workers} completion workers')
+
+    async def close(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def _cache_key(self, messages, kwargs):
+        if not self.cache:
+            return None
+        params = {name: value for name, value in kwargs.items() if name != 'model'}
+        return self.cache.make_key(messages, kwargs.get('model', self.model), **params)
+
+    async def complete(self, messages, guild_id=None, timeout=None, **kwargs):
+        key = self._cache_key(messages, kwargs)
+        if key:
+            response = self.cache.get(key)
+            if response is not None:
+                return response
+
+        response = await self._submit(lambda: self._create(messages, **kwargs), guild_id, timeout)
+
+        if key:
+            self.cache.set(key, response)
+        return response
+
+    async def stream(self, messages, guild_id=None, timeout=None, **kwargs):
+        """Yield the completion's content deltas as they arrive.
+
+        A stream holds one worker for its whole duration, and the timeout
+        covers the complete stream rather than just the first token.
+        """
+        key = self._cache_key(messages, kwargs)
+        if key:
+            response = self.cache.get(key)
+            if response is not None:
+                yield response['choices'][0]['message']['content']
+                return
+
+        sink = asyncio.Queue()
+        task = asyncio.ensure_future(self._submit(lambda: self._pump(sink, messages, **kwargs), guild_id, timeout))
+        # However the job ends (finished, failed, timed out while queued) the reader is woken up
+        task.add_done_callback(lambda _: sink.put_nowait(_STREAM_END))
+
+        parts = []
+        try:
+            while True:
+                delta = await sink.get()
+                if delta is _STREAM_END:
+                    break
+                parts.append(delta)
+                yield delta
+            await task  # Re-raises errors and timeouts from the worker
+        finally:
+            task.cancel()
+
+        if key:
+            self.cache.set(key, {'choices': [{'message': {'role': 'assistant', 'content': ''.join(parts)}}]})
+
+    async def _submit(self, call, guild_id, timeout):
+        self.start()
+        queue = self._pending.get(guild_id)
+        if queue is None:
+            queue = self._pending[guild_id] = deque()
+            self._guilds.append(guild_id)
+        if len(queue) >= self.max_pending_per_guild:
+            raise CompletionQueueFullError(f"Too many pending completions for guild {guild_id}")
+
+        loop = asyncio.get_running_loop()
+        timeout = timeout or self.timeout
+        future = loop.create_future()
+        queue.append((call, future, loop.time() + timeout))
+        self._available.release()
+
+        # The timeout covers the time spent queued as well as the API call;
+        # if it fires first the future is cancelled and the worker skips it.
+        return await asyncio.wait_for(future, timeout)
+
+    def _next_job(self):
+        guild_id = self._guilds.popleft()
+        queue = self._pending[guild_id]
+        job = queue.popleft()
+        if queue:
+            self._guilds.append(guild_id)
+        else:
+            del self._pending[guild_id]
+        return job
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._available.acquire()
+            call, future, deadline = self._next_job()
+            if future.done():
+                continue  # The caller already timed out or was cancelled
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                future.set_exception(asyncio.TimeoutError())
+                continue
+
+            task = asyncio.ensure_future(call())
+            # A caller that gives up frees the worker straight away
+            future.add_done_callback(lambda _, task=task: task.cancel())
+            try:
+                done, _ = await asyncio.wait({task}, timeout=remaining)
+            finally:
+                task.cancel()
+            if future.done():
+                continue
+            if not done:
+                future.set_exception(asyncio.TimeoutError())
+            elif task.exception() is not None:
+                future.set_exception(task.exception())
+            else:
+                future.set_result(task.result())
+
+    async def _create(self, messages, **kwargs):
+        kwargs.setdefault('model', self.model)
+        if hasattr(openai.ChatCompletion, 'acreate'):
+            return await openai.ChatCompletion.acreate(messages=messages, **kwargs)
+        # Older clients only have the blocking call, so run it off the event loop
+        return await asyncio.to_thread(openai.ChatCompletion.create, messages=messages, **kwargs)
+
+    async def _pump(self, sink, messages, **kwargs):
+        kwargs.setdefault('model', self.model)
+        if hasattr(openai.ChatCompletion, 'acreate'):
+            async for chunk in await openai.ChatCompletion.acreate(messages=messages, stream=True, **kwargs):
+                self._put_delta(sink, chunk)
+            return
+
+        # Iterate the blocking stream in a thread and hand each chunk back to the loop
+        loop = asyncio.get_running_loop()
+        def consume():
+            for chunk in openai.ChatCompletion.create(messages=messages, stream=True, **kwargs):
+                loop.call_soon_threadsafe(self._put_delta, sink, chunk)
+        await asyncio.to_thread(consume)
+
+    @staticmethod
+    def _put_delta(sink, chunk):
+        content = chunk['choices'][0]['delta'].get('content')
+        if content:
+            sink.put_nowait(content)
@@ -0,0 +1,118 @@
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# The chat format adds a few tokens of framing around every message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+def make_token_counter(model="gpt-3.5-turbo"):
+    if tiktoken is not None:
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding("cl100k_base")
+        return lambda text: len(encoding.encode(text))
+    # Rough estimate of ~4 characters per token when tiktoken isn't installed
+    return lambda text: len(text) // 4 + 1
+
+
+class ContextWindow:
+    """Sliding window of chat messages bounded by a token budget.
+
+    Each message is counted once when it is appended and the API-format
+    dicts are kept alongside it, so building the prompt never re-counts or
+    re-formats the history. The oldest messages are evicted until the
+    window fits in max_tokens (and max_messages, if set).
+    """
+
+    def __init__(self, max_tokens=3000, max_messages=None, model="gpt-3.5-turbo", count_tokens=None):
+        self.max_tokens = max_tokens
+        self.max_messages = max_messages
+        self.count_tokens = count_tokens or make_token_counter(model)
+        self.total_tokens = 0
+        self._messages = deque()
+        self._api_messages = deque()
+        self._tokens = deque()
+
+    def append(self, message):
+        api_message = {"role": message['role'], "content": message['content']}
+        tokens = self.count_tokens(message['content']) + MESSAGE_OVERHEAD_TOKENS
+        self._messages.append(message)
+        self._api_messages.append(api_message)
+        self._tokens.append(tokens)
+        self.total_tokens += tokens
+        self._evict()
+
+    def extend(self, messages):
+        for message in messages:
+            self.append(message)
+
+    def _evict(self):
+        # Always keep the newest message, even if it alone is over budget
+        while len(self._messages) > 1 and (
+            self.total_tokens > self.max_tokens
+            or (self.max_messages is not None and len(self._messages) > self.max_messages)
+        ):
+            self._messages.popleft()
+            self._api_messages.popleft()
+            self.total_tokens -= self._tokens.popleft()
+
+    def api_messages(self):
+        return list(self._api_messages)
+
+    def messages(self):
+        return list(self._messages)
+
+    def clear(self):
+        self._messages.clear()
+        self._api_messages.clear()
+        self._tokens.clear()
+        self.total_tokens = 0
+
+    def __len__(self):
+        return len(self._messages)
+
+    def __repr__(self):
+        return f'ContextWindow(messages={len(self)}, tokens={self.total_tokens}/{self.max_tokens})'
+
+
+def benchmark(history_size=10_000, que_length=50, max_tokens=3000):
+    history = [{
+        "message_id": str(uuid.uuid4()),
+        "user_id": 0,
+        "username": "benchmark",
+        "role": "user",
+        "content": f"Message number {i} " + "lorem ipsum " * (i % 20),
+        "time": str(datetime.now()),
+    } for i in range(history_size)]
+
+    # The old approach: pop(0) off a list and rebuild the whole context per message
+    start = time.perf_counter()
+    message_que = []
+    for message_object in history:
+        if len(message_que) > que_length:
+            message_que.pop(0)
+        message_que.append(message_object)
+        message_context = [{"role": m['role'], "content": m['content']} for m in message_que]
+    rebuild_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    window = ContextWindow(max_tokens=max_tokens, max_messages=que_length + 1)
+    for message_object in history:
+        window.append(message_object)
+        message_context = window.api_messages()
+    window_time = time.perf_counter() - start
+
+    print(f"History size: {history_size}")
+    print(f"Rebuild per call:   {rebuild_time * 1000:.1f} ms total, {rebuild_time / history_size * 1e6:.1f} us per context")
+    print(f"ContextWindow:      {window_time * 1000:.1f} ms total, {window_time / history_size * 1e6:.1f} us per context")
+    print(f"Final window: {window}, {len(message_context)} messages in context")
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,116 @@
+import os
+import asyncio
+import logging
+from collections import OrderedDict
+
+from history_store import open_history_store
+from context_window import ContextWindow
+
+# Conversation state sharded by (guild, channel, user). Only the most recently
+# used conversations are kept in memory; everything else lives in its own
+# history store on disk and is reloaded from the queue tail when it's needed.
+
+# The conversation that inherits the old global message_history/message_que files.
+# Its context is what every new conversation starts from, so users carry on
+# where the single global context left off.
+DEFAULT_KEY = ('default',)
+
+class Conversation:
+    def __init__(self, key, history, que, window):
+        self.key = key
+        self.history = history
+        self.que = que
+        self.window = window
+        self.lock = asyncio.Lock()
+        self.pending = 0  # Requests that got this conversation and haven't released it yet
+
+    def add_message(self, message_object, context=True):
+        self.history.append(message_object)
+        if context:
+            self.window.append(message_object)
+            self.que.append(message_object)
+
+    def close(self):
+        self.history.close()
+        self.que.close()
+
+    def __repr__(self):
+        return f'Conversation(key={self.key}, window={self.window})'
+
+
+class ConversationStore:
+    def __init__(self, root='conversations', backend='jsonl', max_hot=256, que_length=50, token_budget=3000,
+                 legacy_history=None, legacy_que=None):
+        self.root = root
+        self.backend = backend
+        self.max_hot = max_hot
+        self.que_length = que_length
+        self.token_budget = token_budget
+        self._hot = OrderedDict()
+        self._fallback_context = []
+        if any(path and os.path.exists(path) for path in (legacy_history, legacy_que)):
+            # Migrate the old single-file history into the default conversation's stores
+            self._load(DEFAULT_KEY, legacy_history, legacy_que).close()
+        if os.path.isdir(self._path(DEFAULT_KEY)):
+            que = open_history_store(self.backend, os.path.join(self._path(DEFAULT_KEY), 'que'), max_items=self.que_length)
+            self._fallback_context = que.tail(self.que_length)
+            que.close()
+
+    def get(self, guild_id, channel_id, user_id):
+        """
+        Returns the conversation for a request and marks it in use, so it
+        can't be evicted until release() is called for it.
+        """
+        key = ('dm' if guild_id is None else guild_id, channel_id, user_id)
+        conversation = self._hot.get(key)
+        if conversation is not None:
+            self._hot.move_to_end(key)
+        else:
+            conversation = self._hot[key] = self._load(key)
+        conversation.pending += 1
+        self._evict()
+        return conversation
+
+    def release(self, conversation):
+        conversation.pending -= 1
+        self._evict()
+
+    def _path(self, key):
+        return os.path.join(self.root, *(str(part) for part in key))
+
+    def _load(self, key, legacy_history=None, legacy_que=None):
+        path = self._path(key)
+        os.makedirs(path, exist_ok=True)
+        history = open_history_store(self.backend, os.path.join(path, 'history'), legacy_file=legacy_history)
+        que = open_history_store(self.backend, os.path.join(path, 'que'), max_items=self.que_length, legacy_file=legacy_que)
+        context = que.tail(self.que_length)
+        if not context and self._fallback_context:
+            # A new conversation starts from the migrated global context, kept in its own queue from then on
+            for message_object in self._fallback_context:
+                que.append(message_object)
+            context = self._fallback_context
+        window = ContextWindow(max_tokens=self.token_budget, max_messages=self.que_length)
+        window.extend(context)
+        logging.info(f'Loaded conversation {key} with {len(window)} messages in context')
+        return Conversation(key, history, que, window)
+
+    def _evict(self):
+        # Evict the coldest conversations no request is using or waiting for.
+        # Their messages are already on disk, so dropping them only frees memory.
+        for key in list(self._hot):
+            if len(self._hot) <= self.max_hot:
+                break
+            conversation = self._hot[key]
+            if conversation.pending:
+                continue
+            del self._hot[key]
+            conversation.close()
+            logging.info(f'Evicted cold conversation {key}')
+
+    def close(self):
+        for conversation in self._hot.values():
+            conversation.close()
+        self._hot.clear()
+
+    def __len__(self):
+        return len(self._hot)
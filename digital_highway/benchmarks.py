@@ -0,0 +1,531 @@
+import sys
+import time
+import tracemalloc
+
+# Rough throughput benchmarks for the digital_highway building blocks.
+# Run all of them with `python benchmarks.py`, or pick some by name:
+# `python benchmarks.py bots`
+
+def benchmark_bot_creation(num_bots=1000):
+    from bot import Bot
+
+    start = time.perf_counter()
+    bots = [Bot() for _ in range(num_bots)]
+    elapsed = time.perf_counter() - start
+    print(f"Bot(): created {len(bots)} bots in {elapsed:.2f}s ({len(bots) / elapsed:.0f} bots/s)")
+
+def benchmark_hub_create_bots(num_bots=1000):
+    from hub import Hub
+
+    hub = Hub()
+    start = time.perf_counter()
+    hub.create_bots(num_bots)
+    elapsed = time.perf_counter() - start
+    print(f"Hub.create_bots(): created {len(hub.bots)} bots in {elapsed:.2f}s ({len(hub.bots) / elapsed:.0f} bots/s)")
+
+def benchmark_hub_provision(sizes=(1_000, 10_000, 100_000)):
+    from hub import Hub
+
+    # tracemalloc slows allocation down, so the footprint is measured in a separate run
+    allocated = _traced_bytes(lambda: Hub().provision(sizes[0]))
+    print(f"Hub.provision(): {allocated / sizes[0] / 1024:.1f} KiB per bot")
+    for num_bots in sizes:
+        hub = Hub()
+        start = time.perf_counter()
+        hub.create_bots(num_bots)
+        create_time = time.perf_counter() - start
+        del hub
+        hub = Hub()
+        start = time.perf_counter()
+        bots = hub.provision(num_bots)
+        provision_time = time.perf_counter() - start
+        del hub, bots
+        print(f"  {num_bots} bots: create_bots() {num_bots / create_time:.0f} bots/s, provision() {num_bots / provision_time:.0f} bots/s")
+
+def benchmark_memory(num_items=100_000):
+    from memory import Memory
+
+    memory = Memory()
+    start = time.perf_counter()
+    for i in range(num_items):
+        memory.remember(i)
+    remember_time = time.perf_counter() - start
+
+    items = list(memory.working_memory)
+    start = time.perf_counter()
+    for i, memory_item in enumerate(items):
+        if i % 2:
+            memory.commit_to_short_term(memory_item)
+        else:
+            memory.commit_to_long_term(memory_item)
+    commit_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for memory_item in items:
+        memory.recall(memory_item.id)
+    recall_time = time.perf_counter() - start
+
+    print(f"Memory with {num_items} items:")
+    print(f"  remember: {num_items / remember_time:.0f} items/s")
+    print(f"  commit:   {num_items / commit_time:.0f} moves/s")
+    print(f"  recall:   {num_items / recall_time:.0f} lookups/s")
+
+def _legacy_setup_logger(target, directory):
+    # utils.setup_logger as it was before loggers were shared: a log directory
+    # per instance, and a console and a file handler with their own formatter
+    # added to the class's logger for each one. The file is opened lazily here,
+    # since one open file per item would run out of file descriptors.
+    import os
+    import logging
+    path = os.path.join(directory, target.__class__.__name__, target.id)
+    os.makedirs(path, exist_ok=True)
+    logger = logging.getLogger(f"BotLogger-{target.__class__.__name__}")
+    logger.setLevel(logging.DEBUG)
+    formatter = logging.Formatter('%(asctime)s : %(levelname)s : %(message)s')
+    console_handler = logging.StreamHandler()
+    file_handler = logging.FileHandler(os.path.join(path, f'{target.id}.log'), delay=True)
+    console_handler.setFormatter(formatter)
+    file_handler.setFormatter(formatter)
+    logger.addHandler(console_handler)
+    logger.addHandler(file_handler)
+    return logger
+
+class _LegacyMemoryItem:
+    # MemoryItem as it was before it got __slots__: a uuid4 string id, an
+    # instance __dict__ and a logger per item
+    log_directory = None
+
+    def __init__(self, data):
+        import uuid
+        self.id = str(uuid.uuid4())
+        self.logger = _legacy_setup_logger(self, self.log_directory)
+        self.data = data
+
+def _traced_bytes(build):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    allocated = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del kept
+    return allocated
+
+def benchmark_memory_item_footprint(num_items=100_000, num_legacy_items=10_000):
+    import logging
+    import tempfile
+    from memory import MemoryItem, MemoryTier, ColumnarMemoryTier
+
+    def tier(tier_class, item_class, count, **kwargs):
+        def build():
+            memory_tier = tier_class('benchmark', **kwargs)
+            for i in range(count):
+                memory_tier.append(item_class(float(i)))
+            return memory_tier
+        return build
+
+    # Adding a handler scans the logger's handlers, so legacy items cost quadratic time and get a smaller run
+    with tempfile.TemporaryDirectory() as directory:
+        _LegacyMemoryItem.log_directory = directory
+        legacy = _traced_bytes(tier(MemoryTier, _LegacyMemoryItem, num_legacy_items))
+        logger = logging.getLogger(f"BotLogger-{_LegacyMemoryItem.__name__}")
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+            handler.close()
+
+    results = {
+        'legacy MemoryItem in MemoryTier': legacy / num_legacy_items,
+        'slotted MemoryItem in MemoryTier': _traced_bytes(tier(MemoryTier, MemoryItem, num_items)) / num_items,
+        'ColumnarMemoryTier': _traced_bytes(tier(ColumnarMemoryTier, MemoryItem, num_items)) / num_items,
+        "ColumnarMemoryTier(typecode='d')": _traced_bytes(tier(ColumnarMemoryTier, MemoryItem, num_items, typecode='d')) / num_items,
+    }
+    print(f"Memory footprint of {num_items} float memories ({num_legacy_items} for legacy):")
+    for name, per_item in results.items():
+        print(f"  {name}: {per_item:.0f} bytes per item")
+
+def benchmark_recall_similar(num_items=20_000, num_queries=100, k=5):
+    import random
+    from similarity import VectorIndex
+
+    words = [f'word{i}' for i in range(2_000)]
+    rng = random.Random(0)
+    texts = [' '.join(rng.choices(words, k=12)) for _ in range(num_items)]
+    queries = [' '.join(rng.choices(words, k=4)) for _ in range(num_queries)]
+
+    index = VectorIndex()
+    start = time.perf_counter()
+    index.add_many(range(num_items), texts)
+    insert_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index.search_batch(queries, k)
+    batch_time = time.perf_counter() - start
+
+    # Linear scan baseline: the same embeddings, scored item by item
+    embedder = index.embedder
+    vectors = [embedder.embed(text) for text in texts]
+    norms = [float((vector * vector).sum()) ** 0.5 or 1.0 for vector in vectors]
+    start = time.perf_counter()
+    for query in queries:
+        query_vector = embedder.embed(query)
+        scores = [float(query_vector @ vector) / norm for vector, norm in zip(vectors, norms)]
+        sorted(range(num_items), key=scores.__getitem__, reverse=True)[:k]
+    scan_time = time.perf_counter() - start
+
+    print(f"recall_similar over {num_items} items, {num_queries} queries:")
+    print(f"  insert:      {num_items / insert_time:.0f} items/s")
+    print(f"  batched:     {num_queries / batch_time:.0f} queries/s")
+    print(f"  linear scan: {num_queries / scan_time:.0f} queries/s")
+
+def benchmark_mapped_long_term(num_items=100_000):
+    import os
+    import random
+    import tempfile
+    from memory import MemoryItem, MappedMemoryTier
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'long_term')
+        tier = MappedMemoryTier('long_term', path)
+        items = [MemoryItem({'text': f'memory {i}', 'score': i}) for i in range(num_items)]
+        start = time.perf_counter()
+        for memory_item in items:
+            tier.append(memory_item)
+        append_time = time.perf_counter() - start
+        tier.close()
+
+        start = time.perf_counter()
+        tier = MappedMemoryTier('long_term', path)
+        open_time = time.perf_counter() - start
+
+        sample = random.Random(0).sample([memory_item.id for memory_item in items], 10_000)
+        start = time.perf_counter()
+        for memory_item_id in sample:
+            tier.get(memory_item_id)
+        get_time = time.perf_counter() - start
+        tier.close()
+
+    print(f"MappedMemoryTier with {num_items} items:")
+    print(f"  append:     {num_items / append_time:.0f} items/s")
+    print(f"  cold start: {open_time * 1000:.1f} ms")
+    print(f"  get:        {len(sample) / get_time:.0f} random reads/s")
+
+def benchmark_search(num_objects=10_000, num_queries=200):
+    import random
+    import names
+    from search import Searchable, SearchIndex, ContainsSearch, EqualitySearch, Contains, Equals
+
+    class Record(Searchable):
+        def __init__(self, name, kind, level):
+            self.name = name
+            self.kind = kind
+            self.level = level
+
+    rng = random.Random(0)
+    records = [Record(name, rng.choice(('bot', 'hub')), rng.randrange(100)) for name in names.generate_names(num_objects)]
+    terms = [name.split()[1][:4] for name in names.generate_names(num_queries)]
+
+    start = time.perf_counter()
+    index = SearchIndex()
+    index.add_many(records)
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for term in terms:
+        ContainsSearch().search(records, term)
+    scan_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for term in terms:
+        index.search(Contains(None, term))
+    index_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for level in range(num_queries):
+        EqualitySearch().search(records, level)
+    equal_scan_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for level in range(num_queries):
+        index.search(Equals(None, level))
+    equal_index_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for record in records:
+        record.level += 1
+    update_time = time.perf_counter() - start
+
+    print(f"Search over {num_objects} objects:")
+    print(f"  index build:    {num_objects / build_time:.0f} objects/s")
+    print(f"  contains scan:  {num_queries / scan_time:.0f} queries/s, indexed: {num_queries / index_time:.0f} queries/s")
+    print(f"  equality scan:  {num_queries / equal_scan_time:.0f} queries/s, indexed: {num_queries / equal_index_time:.0f} queries/s")
+    print(f"  indexed update: {num_objects / update_time:.0f} setattrs/s")
+
+def benchmark_dispatch(num_messages=200_000):
+    from handlers import DispatchTable, HandlerFactory
+
+    handlers = list(HandlerFactory.create_handlers().values())
+    table = DispatchTable(handlers)
+    types = ['CommandEvent', 'MessageEvent', 'StatusEvent'] * (num_messages // 3)
+
+    # What Port.handle used to do: ask every handler in turn
+    typed_handlers = [handler for handler in handlers if hasattr(handler, 'can_handle')]
+    start = time.perf_counter()
+    for message_type in types:
+        next(handler for handler in typed_handlers if handler.can_handle(message_type))
+    chain_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for message_type in types:
+        table.resolve(message_type)
+    table_time = time.perf_counter() - start
+
+    print(f"Dispatching {len(types)} messages:")
+    print(f"  can_handle chain: {len(types) / chain_time:.0f} messages/s")
+    print(f"  DispatchTable:    {len(types) / table_time:.0f} messages/s")
+
+def benchmark_event_handlers(num_events=20_000, num_bots=100):
+    from events import TestEvent
+    from handlers import EventHandler, HANDLER_SCOPES
+
+    class BenchmarkBot:
+        pass
+
+    bots = [BenchmarkBot() for _ in range(num_bots)]
+    events = [TestEvent('benchmark', i, None) for i in range(num_events)]
+    print(f"EventHandler.handle with {num_events} events from {num_bots} bots:")
+    for scope in HANDLER_SCOPES:
+        event_handler = EventHandler()
+        event_handler.set_scope('TestEvent', scope)
+        start = time.perf_counter()
+        for i, event in enumerate(events):
+            event_handler.handle(event, bots[i % num_bots])
+        elapsed = time.perf_counter() - start
+        print(f"  {scope}: {num_events / elapsed:.0f} events/s")
+
+def benchmark_event_queue(num_events=20_000, worker_counts=(1, 4, 16)):
+    import asyncio
+    from events import TestEvent
+    from handlers import EventHandler
+    from event_queue import EventQueue
+
+    class IOBoundHandler(EventHandler):
+        async def handle(self, event, bot=None):
+            await asyncio.sleep(0)  # Stands in for a network or disk wait
+
+    async def run(num_workers):
+        queue = EventQueue(maxsize=1_000, num_workers=num_workers)
+        queue.register_handler(TestEvent, IOBoundHandler())
+        start = time.perf_counter()
+        for i in range(num_events):
+            await queue.add_event(TestEvent('benchmark', i, None))
+        await queue.shutdown()
+        return time.perf_counter() - start, queue.metrics()
+
+    print(f"EventQueue with {num_events} events:")
+    for num_workers in worker_counts:
+        elapsed, metrics = asyncio.run(run(num_workers))
+        print(f"  {num_workers} workers: {num_events / elapsed:.0f} events/s, p99 wait {metrics['wait']['p99'] * 1000:.1f} ms")
+
+def benchmark_event_lanes(num_messages=5_000, command_every=100):
+    import asyncio
+    from events import MessageEvent, CommandEvent
+    from handlers import EventHandler
+    from event_queue import EventQueue
+
+    class IOBoundHandler(EventHandler):
+        async def handle(self, event, bot=None):
+            await asyncio.sleep(0)
+
+    async def run(routes):
+        queue = EventQueue(num_workers=4, routes=routes)
+        for event_type in (MessageEvent, CommandEvent):
+            queue.register_handler(event_type, IOBoundHandler())
+        for i in range(num_messages):
+            await queue.add_event(MessageEvent(i, 'benchmark'))
+            if i % command_every == 0:
+                await queue.add_event(CommandEvent('status', 'benchmark'))
+        await queue.shutdown()
+        return queue.metrics()['lanes']
+
+    print(f"Command wait behind a flood of {num_messages} messages:")
+    for label, routes in (('FIFO', {}), ('lanes', None)):
+        lanes = asyncio.run(run(routes))
+        lane = lanes['command'] if lanes['command']['wait']['count'] else lanes['default']
+        print(f"  {label}: p99 command wait {lane['wait']['p99'] * 1000:.1f} ms")
+
+def benchmark_event_starvation(num_messages=4_000, command_after=1.5):
+    import asyncio
+    from events import MessageEvent, CommandEvent
+    from handlers import EventHandler
+    from event_queue import EventQueue
+
+    # The message backlog outlives starvation_after, so the default lane is
+    # starving the whole time; the command should still get ahead of it
+    class SlowHandler(EventHandler):
+        async def handle(self, event, bot=None):
+            await asyncio.sleep(0.001)
+
+    async def run():
+        queue = EventQueue(num_workers=1)
+        for event_type in (MessageEvent, CommandEvent):
+            queue.register_handler(event_type, SlowHandler())
+        for i in range(num_messages):
+            await queue.add_event(MessageEvent(i, 'benchmark'))
+        await asyncio.sleep(command_after)
+        behind = len(queue)
+        await queue.add_event(CommandEvent('status', 'benchmark'))
+        await queue.shutdown()
+        return behind, queue.metrics()['lanes']
+
+    behind, lanes = asyncio.run(run())
+    print(f"Command added {command_after}s into a flood of {num_messages} messages, with {behind} still queued:")
+    print(f"  command wait {lanes['command']['wait']['max'] * 1000:.1f} ms, max message wait {lanes['default']['wait']['max']:.2f}s")
+
+def benchmark_event_batching(num_events=20_000):
+    import os
+    import asyncio
+    import tempfile
+    from events import MessageEvent
+    from handlers import EventHandler
+    from event_queue import EventQueue
+
+    # Both handlers append events to a file and fsync it, once per call
+    class FileHandler(EventHandler):
+        def __init__(self, path):
+            super().__init__()
+            self.file = open(path, 'a')
+
+        def write(self, events):
+            self.file.write(''.join(f'{event.payload}\n' for event in events))
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+        def handle(self, event, bot=None):
+            self.write([event])
+
+    class BatchedFileHandler(FileHandler):
+        max_batch_size = 256
+        max_linger = 0.005
+
+        def handle_batch(self, events, bot=None):
+            self.write(events)
+
+    async def run(handler):
+        queue = EventQueue(num_workers=4)
+        queue.register_handler(MessageEvent, handler)
+        start = time.perf_counter()
+        for i in range(num_events):
+            await queue.add_event(MessageEvent(i, 'benchmark'))
+        await queue.shutdown()
+        return time.perf_counter() - start
+
+    print(f"Writing {num_events} events to a file through EventQueue:")
+    with tempfile.TemporaryDirectory() as directory:
+        for label, handler_class in (('handle', FileHandler), ('handle_batch', BatchedFileHandler)):
+            handler = handler_class(os.path.join(directory, label))
+            elapsed = asyncio.run(run(handler))
+            handler.file.close()
+            print(f"  {label}: {num_events / elapsed:.0f} events/s")
+
+def benchmark_wal(num_events=20_000, num_producers=64):
+    import os
+    import asyncio
+    import tempfile
+    from events import MessageEvent
+    from handlers import EventHandler
+    from event_queue import EventQueue
+    from wal import WriteAheadLog
+
+    class NullHandler(EventHandler):
+        def handle(self, event, bot=None):
+            pass
+
+    async def run(wal, drain=True):
+        queue = EventQueue(num_workers=4, wal=wal)
+        queue.register_handler(MessageEvent, NullHandler())
+
+        async def produce(offset):
+            for i in range(offset, num_events, num_producers):
+                await queue.add_event(MessageEvent(i, 'benchmark'))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(produce(offset) for offset in range(num_producers)))
+        elapsed = time.perf_counter() - start
+        await queue.shutdown(drain=drain)
+        return elapsed
+
+    print(f"Adding {num_events} events from {num_producers} producers:")
+    with tempfile.TemporaryDirectory() as directory:
+        configurations = (
+            ('no WAL', None),
+            ('WAL, no fsync', dict(fsync=False)),
+            ('WAL, fsync, async commit', dict(fsync=True, sync_commit=False)),
+            ('WAL, fsync, sync commit', dict(fsync=True, sync_commit=True)),
+        )
+        for label, options in configurations:
+            wal = WriteAheadLog(os.path.join(directory, label), **options) if options is not None else None
+            elapsed = asyncio.run(run(wal))
+            print(f"  {label}: {num_events / elapsed:.0f} events/s")
+
+        # Shut down without draining, then time recovering what was left queued
+        path = os.path.join(directory, 'replay')
+        asyncio.run(run(WriteAheadLog(path, fsync=False), drain=False))
+        start = time.perf_counter()
+        recovered = len(WriteAheadLog(path).replay())
+        elapsed = time.perf_counter() - start
+        print(f"  replay: {recovered} events in {elapsed * 1000:.1f} ms ({recovered / elapsed:.0f} events/s)")
+
+class _LegacyEvent:
+    # Event as it was before it got __slots__: a uuid4 string id, a datetime,
+    # and an EventLog and metadata dict allocated up front in an instance __dict__
+    def __init__(self, payload):
+        from datetime import datetime
+        from events import EventLog
+        import utils
+        self._id = utils.generate_unique_id()
+        self._payload = payload
+        self._timestamp = datetime.now()
+        self._log = EventLog()
+        self._metadata = {}
+
+def benchmark_event_allocation(num_events=100_000):
+    from events import MessageEvent
+
+    class LegacyMessageEvent(_LegacyEvent):
+        def __init__(self, message, sender):
+            super().__init__(message)
+            self._sender = sender
+
+    print(f"Creating {num_events} MessageEvents:")
+    for label, event_class in (('legacy', LegacyMessageEvent), ('slotted', MessageEvent)):
+        allocated = _traced_bytes(lambda: [event_class('benchmark', 'sender') for _ in range(num_events)])
+        start = time.perf_counter()
+        events = [event_class('benchmark', 'sender') for _ in range(num_events)]
+        elapsed = time.perf_counter() - start
+        del events
+        print(f"  {label}: {allocated / num_events:.0f} bytes per event, {num_events / elapsed:.0f} events/s")
+
+BENCHMARKS = {
+    'bots': benchmark_bot_creation,
+    'hub': benchmark_hub_create_bots,
+    'provision': benchmark_hub_provision,
+    'memory': benchmark_memory,
+    'memory_items': benchmark_memory_item_footprint,
+    'recall_similar': benchmark_recall_similar,
+    'long_term': benchmark_mapped_long_term,
+    'search': benchmark_search,
+    'dispatch': benchmark_dispatch,
+    'event_handlers': benchmark_event_handlers,
+    'event_queue': benchmark_event_queue,
+    'event_lanes': benchmark_event_lanes,
+    'event_starvation': benchmark_event_starvation,
+    'event_batching': benchmark_event_batching,
+    'wal': benchmark_wal,
+    'event_allocation': benchmark_event_allocation,
+}
+
+def main(names=None):
+    for name in names or BENCHMARKS:
+        if name not in BENCHMARKS:
+            raise ValueError(f"Unknown benchmark '{name}'. Expected one of {list(BENCHMARKS)}")
+        BENCHMARKS[name]()
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -5,37 +5,48 @@ from memory import Memory
 from bot_behaviors import Behavior, BehaviorHandler, BehaviorFactory
 from typing import Any, Dict, List, Union
 from event_queue import EventQueue
-from handlers import CommandEventHandler, EventHandler, MessageEventHandler, MessageHandler, ConnectionHandler, GeneralHandler
+from handlers import CommandEventHandler, EventHandler, MessageEventHandler, MessageHandler, GeneralHandler
 from events import Event, MessageEvent, CommandEvent
 from brains import ThreadedBrain
 from formatters import BaseFormatter, JSONFormatter
 from config import DefaultBotConfig
+from search import Searchable
 import asyncio
 import utils
 import pprint
 
-class Bot:
-    def __init__(self, config=None):
-        self._initialize_default_config(DefaultBotConfig)
+class Bot(Searchable):
+    def __init__(self, config=None, handlers=None, template=None):
+        # Bots built from a BotTemplate skip the checks it already made and share its stateless parts
+        if template is None:
+            self._initialize_default_config(DefaultBotConfig)
+        else:
+            self.config = DefaultBotConfig
+            utils.run_default_config(self, DefaultBotConfig.DEFAULT_CONFIG)
+            handlers = template.handlers
         self.setup_logger()
         self.lock = threading.Lock()
-        self.name = utils.generate_name()
+        # A name can be handed in, e.g. by Hub.create_bots which generates them in batches
+        self.name = config.get('name') if isinstance(config, dict) and config.get('name') else utils.generate_name()
         self.type = self.__class__.__name__
         self.base_type = self.__class__.__name__
-        self.formatter = JSONFormatter(self)
-        self.q = EventQueue()
+        self.formatter = template.formatter if template is not None else JSONFormatter(self)
+        self.q = EventQueue(self)
 
         # Bind the class instances
-        self.port = Port({'owner': self}) if not hasattr(self, 'port') else self.port
+        # Bots live in the same process as their peers, so their Ports use trusted connections
+        self.port = Port({'owner': self, 'is_trusted': True}, handlers) if not hasattr(self, 'port') else self.port
         self.state = State({'owner': self}) if not hasattr(self, 'state') else self.state
         self.behavior = BehaviorHandler({'owner': self}) if not hasattr(self, 'behavior') else self.behavior
         self.memory = Memory({'owner': self}) if not hasattr(self, 'memory') else self.memory
         self.brain = ThreadedBrain({'owner': self}) if not hasattr(self, 'brain') else self.brain
-        self.message_handler = MessageHandler({'owner': self}) if not hasattr(self, 'message_handler') else self.message_handler
-        self.connection_handler = ConnectionHandler({'owner': self}) if not hasattr(self, 'connection_handler') else self.connection_handler
-
-        if config:
-            utils.update_config(self, config)
+        if template is not None:
+            self.message_handler = template.message_handler
+            template.apply(self, config)
+        else:
+            self.message_handler = MessageHandler({'owner': self}) if not hasattr(self, 'message_handler') else self.message_handler
+            if config:
+                utils.update_config(self, config)
 
     def _initialize_default_config(self, config):
         self.config = config
@@ -43,9 +54,7 @@ class Bot:
         utils.verify_config(self, config.REQUIRED_KEYS)
 
     def setup_logger(self):
-        logger_instance = utils.SingletonLogger(self.__class__.__name__)
-        logger_instance.set_level(self._logger_level)
-        self.logger = logger_instance.get_logger()
+        self.logger = utils.setup_logger(self, self._logger_level)
 
     async def handle_event(self, event):
         if isinstance(event, MessageEvent):
@@ -64,11 +73,11 @@ class Bot:
             self.logger.error(f"Error executing command {command}: {str(e)}")
 
     async def add_event(self, event):
-        self.q.add_event(event)
+        return await self.q.add_event(event)
 
     async def process_events(self):
-        while self.is_active:
-            await self.q.process_events(self)
+        # The queue's workers keep running; this waits for what's queued so far
+        await self.q.process_events()
 
     def learn(self, behavior):
         if isinstance(behavior, Behavior):
@@ -85,7 +94,7 @@ class Bot:
             raise TypeError("Formatter should be a subclass of BaseFormatter")
 
     async def send(self, data, destination):
-        formatted_data = await self.formatter.format(data)
+        formatted_data = await self.formatter.format(data, self)
         if isinstance(destination, Port):
             await destination.receive(formatted_data)
         elif isinstance(destination, Bot):
@@ -60,6 +60,45 @@ class Config:
         return f'Config({safe_settings})'
 
 
+class BotTemplate:
+    """
+    A bot config that is validated once and reused for many bots.
+
+    Restricted and private keys are rejected once, up front, instead of
+    being checked, and skipped with a warning, for every bot. Bots built
+    from a template also share its stateless parts: the dispatch table
+    their Ports route with, a JSONFormatter that's handed the sending bot
+    on each call, and a MessageHandler.
+    """
+    def __init__(self, config=None, handlers=None):
+        restricted_keys = DefaultBotConfig.DEFAULT_CONFIG['_restricted_config_keys']()
+        config = dict(config or {})
+        skipped = [key for key in config if key.startswith('_') or key in restricted_keys]
+        if skipped:
+            raise ValueError(f"Bot templates can't set restricted keys: {skipped}")
+        self.config = config
+        from handlers import DispatchTable, MessageHandler
+        from formatters import JSONFormatter
+        if handlers is None:
+            handlers = DispatchTable.default()
+        elif not isinstance(handlers, DispatchTable):
+            handlers = DispatchTable.default().with_handlers(handlers)
+        self.handlers = handlers
+        self.formatter = JSONFormatter()
+        self.message_handler = MessageHandler()
+
+    def apply(self, bot, config=None):
+        # Sets the template's config on a bot without checking it again; config only adds a name
+        for key, value in self.config.items():
+            setattr(bot, key, value() if callable(value) else value)
+        if config:
+            bot.name = config.get('name', bot.name)
+
+    def build(self, name=None):
+        from bot import Bot
+        return Bot({'name': name} if name else None, template=self)
+
+
 class DefaultBotConfig:
     REQUIRED_KEYS = ['id', 'inventory', 'logger', 'lock', 'port', 'state', 'memory', 'brain']
     DEFAULT_CONFIG = {
@@ -0,0 +1,267 @@
+import time
+import heapq
+import shelve
+import threading
+from itertools import islice
+import utils
+from memory import MemoryItem
+
+_MISSING = object()
+
+class AccessStats:
+    __slots__ = ('count', 'last_access', 'weight')
+
+    def __init__(self):
+        self.count = 0
+        self.last_access = 0.0
+        self.weight = 0.0
+
+class ConsolidationPolicy:
+    """
+    Decides which memories are hot and which are cold.
+
+    score() orders the items in a tier; the lowest scoring ones are demoted
+    first when the tier is over capacity. should_promote() is asked about
+    items that were recalled from a lower tier.
+    """
+    def record(self, stats, now):
+        stats.count += 1
+        stats.last_access = now
+
+    def score(self, stats, now):
+        raise NotImplementedError("This method should be overridden in subclass")
+
+    def should_promote(self, stats, now):
+        raise NotImplementedError("This method should be overridden in subclass")
+
+class LRUPolicy(ConsolidationPolicy):
+    def score(self, stats, now):
+        return stats.last_access if stats else 0.0
+
+    def should_promote(self, stats, now):
+        return True  # It was just used
+
+class LFUPolicy(ConsolidationPolicy):
+    def __init__(self, promote_after=3):
+        self.promote_after = promote_after
+
+    def score(self, stats, now):
+        return stats.count if stats else 0
+
+    def should_promote(self, stats, now):
+        return stats.count >= self.promote_after
+
+class RecencyWeightedPolicy(ConsolidationPolicy):
+    # Every access adds 1 to a weight that halves every half_life seconds
+    def __init__(self, half_life=300.0, promote_after=2.0):
+        self.half_life = half_life
+        self.promote_after = promote_after
+
+    def _decayed(self, stats, now):
+        return stats.weight * 0.5 ** ((now - stats.last_access) / self.half_life)
+
+    def record(self, stats, now):
+        stats.weight = self._decayed(stats, now) + 1.0
+        super().record(stats, now)
+
+    def score(self, stats, now):
+        return self._decayed(stats, now) if stats else 0.0
+
+    def should_promote(self, stats, now):
+        return self._decayed(stats, now) >= self.promote_after
+
+class DiskMemoryTier:
+    """
+    Memory tier stored on disk with shelve, used as the spill tier below
+    long-term memory. Only the shelf's own index is kept in RAM.
+    """
+    def __init__(self, name, path):
+        self.name = name
+        self.path = path
+        self._shelf = shelve.open(path)
+        if len(self._shelf):
+            MemoryItem.advance_ids(max(map(int, self._shelf)))
+
+    def append(self, memory_item):
+        self._shelf[str(memory_item.id)] = memory_item.data
+
+    def remove(self, memory_item):
+        del self._shelf[str(memory_item.id)]
+
+    def get(self, memory_item_id):
+        data = self._shelf.get(str(memory_item_id), _MISSING)
+        return None if data is _MISSING else MemoryItem(data, memory_item_id)
+
+    def clear(self):
+        self._shelf.clear()
+
+    def sync(self):
+        self._shelf.sync()
+
+    def close(self):
+        self._shelf.close()
+
+    def __contains__(self, memory_item):
+        return str(getattr(memory_item, 'id', None)) in self._shelf
+
+    def __iter__(self):
+        for key in self._shelf:
+            yield MemoryItem(self._shelf[key], int(key))
+
+    def __len__(self):
+        return len(self._shelf)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f'{self.name} index out of range')
+        return next(islice(iter(self), index, None))
+
+    def __repr__(self):
+        return f'DiskMemoryTier(name={self.name}, path={self.path}, items={len(self)})'
+
+class ConsolidationEngine:
+    """
+    Moves memories between a Memory's tiers in the background.
+
+    Every step demotes at most batch_size of the coldest items out of each
+    tier that's over its capacity, and promotes recently recalled items from
+    lower tiers when the policy says they're hot. With an archive_path,
+    long-term memory spills into a DiskMemoryTier, so a bot's resident
+    memory stays bounded however long it runs.
+    """
+    DEFAULT_CAPACITIES = {
+        'working_memory': 128,
+        'short_term': 1024,
+        'long_term': 8192,
+    }
+
+    def __init__(self, memory, policy=None, capacities=None, batch_size=64, interval=1.0, archive_path=None):
+        self.id = utils.generate_unique_id()
+        self.memory = memory
+        self.policy = policy or LRUPolicy()
+        self.capacities = dict(self.DEFAULT_CAPACITIES, **(capacities or {}))
+        self.batch_size = batch_size
+        self.interval = interval
+        self.logger = utils.setup_logger(self, 'DEBUG')
+        self._stats = {}  # memory item id -> AccessStats, only for items that were recalled
+        self._touched = {}  # ids recalled since the last step, in order, waiting for a promotion check
+        self._stop = threading.Event()
+        self._thread = None
+
+        if archive_path and memory.archive is None:
+            memory.archive = DiskMemoryTier('archive', archive_path)
+        memory._recall_listeners.append(self.touch)
+
+    def touch(self, memory_item_id):
+        stats = self._stats.get(memory_item_id)
+        if stats is None:
+            stats = self._stats[memory_item_id] = AccessStats()
+        self.policy.record(stats, time.monotonic())
+        self._touched[memory_item_id] = None
+
+    def _score(self, memory_item, now):
+        return self.policy.score(self._stats.get(memory_item.id), now)
+
+    def step(self):
+        with self.memory.lock:
+            promoted = self._promote()
+            demoted = self._demote()
+        if promoted or demoted:
+            self.logger.debug(f"Consolidation step promoted {promoted} and demoted {demoted} memories")
+        return promoted, demoted
+
+    def _promote(self):
+        now = time.monotonic()
+        tiers = self.memory.tiers()
+        promoted = 0
+        for memory_item_id in list(islice(self._touched, self.batch_size)):
+            del self._touched[memory_item_id]
+            tier = self.memory._tier_of(memory_item_id)
+            if tier is None or tier is tiers[0]:
+                continue
+            stats = self._stats.get(memory_item_id)
+            if stats is None or not self.policy.should_promote(stats, now):
+                continue
+            # The upper tier may go over capacity here; the demotion pass that
+            # follows makes room by pushing its coldest item down instead
+            upper = tiers[tiers.index(tier) - 1]
+            if self.memory.transfer(tier.get(memory_item_id), upper):
+                promoted += 1
+        return promoted
+
+    def _demote(self):
+        now = time.monotonic()
+        tiers = self.memory.tiers()
+        demoted = 0
+        for upper, lower in zip(tiers, tiers[1:]):
+            capacity = self.capacities.get(upper.name)
+            if capacity is None or len(upper) <= capacity:
+                continue
+            count = min(len(upper) - capacity, self.batch_size)
+            for memory_item in heapq.nsmallest(count, upper, key=lambda item: self._score(item, now)):
+                if self.memory.transfer(memory_item, lower):
+                    demoted += 1
+                    if lower is self.memory.archive:
+                        # Forget the access stats of archived items so they don't grow without bound
+                        self._stats.pop(memory_item.id, None)
+        return demoted
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=f'ConsolidationEngine-{self.id}', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        if self.memory.archive is not None and hasattr(self.memory.archive, 'sync'):
+            self.memory.archive.sync()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.step()
+            except Exception as e:
+                self.logger.error(f"Error during memory consolidation: {str(e)}", exc_info=True)
+
+def test_consolidation():
+    import os
+    import tempfile
+    from memory import Memory
+
+    with tempfile.TemporaryDirectory() as directory:
+        memory = Memory()
+        engine = ConsolidationEngine(
+            memory,
+            policy=LFUPolicy(promote_after=2),
+            capacities={'working_memory': 10, 'short_term': 10, 'long_term': 10},
+            batch_size=100,
+            archive_path=os.path.join(directory, 'archive'),
+        )
+        items = [memory.remember(i) for i in range(100)]
+        for _ in range(5):
+            engine.step()
+
+        # Every tier is back under its capacity and the rest spilled to disk
+        assert len(memory.working_memory) <= 10
+        assert len(memory.short_term) <= 10
+        assert len(memory.long_term) <= 10
+        assert len(memory) == 100
+        assert len(memory.archive) >= 70
+
+        # Archived memories can still be recalled, and hot ones are promoted back up
+        archived = next(item for item in items if memory._tier_of(item.id) is memory.archive)
+        assert memory.recall(archived.id).data == archived.data
+        memory.recall(archived.id)
+        engine.step()
+        assert memory._tier_of(archived.id) is memory.long_term
+        memory.archive.close()
+
+if __name__ == '__main__':
+    print("Testing ConsolidationEngine")
+    test_consolidation()
@@ -41,12 +41,36 @@ class HandlerError(Error):
     """
     pass
 
+class QueueFullError(Error):
+    """
+    Raised when an event is added to a full queue that rejects overflow.
+    """
+    pass
+
 class RetryExceededError(Error):
     """
     Raised when the maximum number of retries has been exceeded.
     """
     pass
 
+class InvalidDestinationError(Error):
+    """
+    Raised when a message is sent to a Port that isn't connected.
+    """
+    pass
+
+class UnconnectedDestinationError(Error):
+    """
+    Raised when a destination has no connection to send through.
+    """
+    pass
+
+class UnhandledTypeError(Error):
+    """
+    Raised when a Port receives data of a type no handler accepts.
+    """
+    pass
+
 
 # Example usage:
 if __name__ == '__main__':
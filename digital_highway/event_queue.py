@@ -1,20 +1,274 @@
 # event_queue.py
+import time
+import inspect
 from typing import List, Dict, Type, Any, Callable, Union
 from threading import Lock
-from collections import defaultdict
+from collections import defaultdict, deque
 from utils import setup_logger, generate_unique_id
 from events import Event
 from handlers import EventHandler
+from errors import QueueFullError, RetryExceededError
+from retry import RetryPolicy, TimerWheel, DeadLetter, DeadLetterQueue
 import asyncio
 
-class EventQueue:
+# What add_event does when a bounded queue is full
+BLOCK = 'block'  # Wait for room
+DROP_OLDEST = 'drop_oldest'  # Make room by discarding the oldest queued event
+DROP_NEWEST = 'drop_newest'  # Discard the event being added
+REJECT = 'reject'  # Raise QueueFullError
+OVERFLOW_POLICIES = (BLOCK, DROP_OLDEST, DROP_NEWEST, REJECT)
+
+# What happens to an event that's still queued when its deadline passes
+DROP = 'drop'
+DEPRIORITIZE = 'deprioritize'  # Move it to the stale lane, served when nothing else is waiting
+EXPIRY_POLICIES = (DROP, DEPRIORITIZE)
+STALE_LANE = 'stale'
+
+class LatencyStats:
+    # Count, mean and max over everything, percentiles over the most recent samples
+    def __init__(self, window=1024):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.window = window
+        self._recent = None  # Created with the first sample; most bots' queues never see one
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        if self._recent is None:
+            self._recent = deque(maxlen=self.window)
+        self._recent.append(seconds)
+
+    def percentile(self, fraction):
+        if not self._recent:
+            return 0.0
+        ordered = sorted(self._recent)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'p50': self.percentile(0.5),
+            'p99': self.percentile(0.99),
+            'max': self.max,
+        }
+
+class QueueMetrics:
     def __init__(self):
+        self.enqueued = 0
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.expired = 0
+        self.retried = 0
+        self.dead_lettered = 0
+        self.max_depth = 0
+        self.wait = LatencyStats()  # Seconds from add_event until a worker picks the event up
+        self.handling = LatencyStats()  # Seconds spent running the event's handlers
+
+    def snapshot(self, depth):
+        return {
+            'depth': depth,
+            'max_depth': self.max_depth,
+            'enqueued': self.enqueued,
+            'processed': self.processed,
+            'failed': self.failed,
+            'dropped': self.dropped,
+            'rejected': self.rejected,
+            'expired': self.expired,
+            'retried': self.retried,
+            'dead_lettered': self.dead_lettered,
+            'wait': self.wait.snapshot(),
+            'handling': self.handling.snapshot(),
+        }
+
+class Lane:
+    """
+    A FIFO of queued events that share a weight and a default deadline.
+
+    Lanes are served in proportion to their weights, so a lane with weight 8
+    gets eight events handled for every one from a lane with weight 1 while
+    both have work. deadline is the default number of seconds an event may
+    wait before it's stale; on_expired says whether stale events are dropped
+    or deprioritized.
+    """
+    def __init__(self, name, weight=1, deadline=None, on_expired=DROP):
+        if on_expired not in EXPIRY_POLICIES:
+            raise ValueError(f"Unknown expiry policy '{on_expired}'. Expected one of {EXPIRY_POLICIES}")
+        self.name = name
+        self.weight = weight
+        self.deadline = deadline
+        self.on_expired = on_expired
+        self.entries = deque()  # (enqueued at, expires at or None, event, WAL sequence number or None)
+        self.credit = 0  # Smooth weighted round-robin state
+        self.expired = 0
+        self.dropped = 0
+        self.wait = LatencyStats()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def snapshot(self):
+        return {'depth': len(self.entries), 'weight': self.weight, 'expired': self.expired, 'dropped': self.dropped, 'wait': self.wait.snapshot()}
+
+class Batcher:
+    """
+    Collects events for one handler that implements handle_batch(events, bot).
+
+    A batch is delivered once it holds the handler's max_batch_size events,
+    or max_linger seconds after its first event arrived, whichever is first.
+    Only one batch is in flight at a time, so handle_batch never runs
+    concurrently with itself; the next batch collects behind it and goes
+    out as soon as it's done. Once a full batch is waiting, submit() waits
+    too, which holds up the worker and so pushes back on add_event through
+    the queue's bound. submit() returns a future that resolves to whether
+    the batch succeeded. A failed batch is retried as a whole under the
+    handler's retry policy, and stays in flight until it's given up on.
+    """
+    def __init__(self, handler, queue):
+        self.handler = handler
+        self.queue = queue
+        self.owner = queue.owner
+        self.logger = queue.logger
+        self.max_batch_size = getattr(handler, 'max_batch_size', 100)
+        self.max_linger = getattr(handler, 'max_linger', 0.01)
+        self._pending = []  # (event, future)
+        self._timer = None
+        self._in_flight = None  # Resolves once the batch being delivered is done with
+
+    async def submit(self, event):
+        while self._in_flight is not None and len(self._pending) >= self.max_batch_size:
+            await asyncio.shield(self._in_flight)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((event, future))
+        if len(self._pending) >= self.max_batch_size:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_linger, self.flush)
+        return future
+
+    def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending or self._in_flight is not None:
+            return  # Sent once the in-flight batch is done
+        batch, self._pending = self._pending[:self.max_batch_size], self._pending[self.max_batch_size:]
+        self._in_flight = asyncio.get_running_loop().create_future()
+        self.queue._spawn(self._deliver(batch))
+
+    def _delivered(self):
+        in_flight, self._in_flight = self._in_flight, None
+        in_flight.set_result(None)
+        self.flush()
+
+    async def _deliver(self, batch, attempt=1):
+        events = [event for event, _ in batch]
+        try:
+            result = self.handler.handle_batch(events, self.owner)
+            if inspect.isawaitable(result):
+                await result
+            self.logger.info(f"Batch of {len(events)} events processed successfully by handler {type(self.handler).__name__}")
+        except Exception as e:
+            self.logger.error(f"Error processing a batch of {len(events)} events with handler {type(self.handler).__name__}: {str(e)}", exc_info=True)
+            policy = self.queue.retry_policy_for(self.handler)
+            if policy.should_retry(attempt):
+                self.queue._metrics.retried += 1
+                self.queue.timers.schedule(policy.delay(attempt), lambda: self.queue._spawn(self._deliver(batch, attempt + 1)))
+                return
+            for event, future in batch:
+                self.queue._dead_letter(event, self.handler, attempt, e)
+                future.set_result(False)
+            self._delivered()
+            return
+        for _, future in batch:
+            future.set_result(True)
+        self._delivered()
+
+def default_lanes():
+    # Commands like stop and shutdown shouldn't wait behind a flood of chat messages
+    return [Lane('command', weight=8), Lane('default', weight=1)]
+
+class EventQueue:
+    """
+    Bounded, lane-scheduled event queue drained by a pool of long-lived workers.
+
+    Each event type is routed to a lane (routes maps event classes or class
+    names to lane names; anything else goes to 'default'). Workers pick the
+    next lane by smooth weighted round-robin. As starvation protection, once
+    starvation_every weighted picks have been made, the next pick goes to
+    the lane whose oldest event has waited longest, if that's more than
+    starvation_after seconds. A starving lane thus gets a bounded share of
+    the workers without overriding the weights. Events that outlive their
+    deadline are dropped or moved to the stale lane, depending on their
+    lane's policy.
+
+    maxsize=0 leaves the queue unbounded. When a bounded queue is full,
+    add_event applies the overflow policy (see OVERFLOW_POLICIES);
+    drop_oldest evicts from the lowest-weight lane that has events. Workers
+    are started with the first event, or explicitly with start(), and run
+    until shutdown(), which by default lets them drain the queue first.
+    Queue-wide and per-lane metrics are in metrics().
+
+    A handler that raises is retried with jittered exponential backoff, per
+    its retry_policy or else the queue's. Retries wait on a TimerWheel, not
+    in the workers. Once a handler's attempts are used up the event goes to
+    dead_letters, from which replay_dead_letters() can run it again.
+
+    With a WriteAheadLog as wal, every accepted event is logged before it's
+    queued and acknowledged once it's handled, dropped, expired or
+    dead-lettered. After a crash, recover() queues whatever the previous run
+    left unacknowledged. shutdown(drain=False) leaves the queued events in
+    the log for the next run.
+    """
+    def __init__(self, owner=None, maxsize=0, overflow=BLOCK, num_workers=1, lanes=None, routes=None, starvation_after=1.0,
+                 starvation_every=8, retry_policy=None, dead_letter_maxlen=10_000, wal=None):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy '{overflow}'. Expected one of {OVERFLOW_POLICIES}")
         self.id = generate_unique_id()
+        self.owner = owner
         self.lock = Lock()
-        self.event_queue = asyncio.Queue()
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.num_workers = num_workers
+        self.starvation_after = starvation_after
+        self.starvation_every = starvation_every
+        self._weighted_picks = 0  # Since a starving lane was last served
+        self.lanes = {lane.name: lane for lane in (lanes if lanes is not None else default_lanes())}
+        self.lanes.setdefault('default', Lane('default'))
+        self.lanes.setdefault(STALE_LANE, Lane(STALE_LANE, weight=0))
+        self.routes = routes if routes is not None else {'CommandEvent': 'command'}
         self.event_handlers: Dict[Type[Event], List[Union[EventHandler, Callable[[Event], Any]]]] = defaultdict(list)
         self.logger = setup_logger(self)
-        self.processing_task = None
+        self.workers = []
+        self.accepting = True
+        self._size = 0
+        self._unfinished = 0
+        self._condition = None  # Created on first use, inside the running loop
+        self._idle = None
+        self._metrics = QueueMetrics()
+        self._batchers = {}  # id(handler) -> Batcher, for handlers with handle_batch
+        self._tasks = set()  # Retry and batch delivery tasks, referenced until they finish
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.timers = TimerWheel()
+        self.dead_letters = DeadLetterQueue(dead_letter_maxlen)
+        self.wal = wal
+
+    def __len__(self):
+        return self._size
+
+    def _sync_primitives(self):
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+            self._idle = asyncio.Event()
+            self._idle.set()
+        return self._condition
 
     def register_handler(self, event_type: Type[Event], handler: EventHandler):
         with self.lock:
@@ -23,49 +277,333 @@ class EventQueue:
             else:
                 raise ValueError("Handler must be an instance of EventHandler")
 
-    async def add_event(self, event: Event):
-        await self.event_queue.put(event)
-        self.logger.info(f'Event {event.id} added to the queue. Current queue length: {self.event_queue.qsize()}')
-        if self.processing_task is None or self.processing_task.done():
-            self.processing_task = asyncio.create_task(self.process_events())
+    def lane_for(self, event):
+        event_type = type(event)
+        name = self.routes.get(event_type) or self.routes.get(event_type.__name__)
+        return self.lanes.get(name, self.lanes['default'])
+
+    async def add_event(self, event: Event, deadline=None, lane=None):
+        """
+        Queues an event. deadline (seconds) overrides the lane's default and
+        lane (a lane name) overrides the route. Returns False if the event
+        was dropped, and raises QueueFullError under the reject policy.
+        """
+        if not self.accepting:
+            self.logger.warning(f'Event {event.id} refused: the queue is shutting down.')
+            return False
+        lane = self.lanes[lane] if lane is not None else self.lane_for(event)
+        return await self._enqueue(event, lane, deadline)
+
+    async def _enqueue(self, event, lane, deadline, sequence=None):
+        # sequence is given for events recovered from the WAL, which are already logged
+        condition = self._sync_primitives()
+        committed = None
+        async with condition:
+            if self.maxsize and self._size >= self.maxsize:
+                if self.overflow == BLOCK:
+                    await condition.wait_for(lambda: self._size < self.maxsize)
+                elif self.overflow == DROP_OLDEST:
+                    victim_lane = min((candidate for candidate in self.lanes.values() if candidate.entries), key=lambda candidate: candidate.weight)
+                    _, _, dropped, dropped_sequence = victim_lane.entries.popleft()
+                    victim_lane.dropped += 1
+                    self._discard(dropped_sequence)
+                    self._metrics.dropped += 1
+                    self.logger.warning(f'Queue full, dropped oldest event {dropped.id} in lane {victim_lane.name} for {event.id}')
+                elif self.overflow == DROP_NEWEST:
+                    lane.dropped += 1
+                    self._metrics.dropped += 1
+                    self.logger.warning(f'Queue full, dropped event {event.id}')
+                    self._ack(sequence)
+                    return False
+                else:
+                    self._metrics.rejected += 1
+                    self._ack(sequence)
+                    raise QueueFullError(f"EventQueue {self.id} is full", maxsize=self.maxsize)
+
+            if sequence is None and self.wal is not None:
+                sequence, committed = self.wal.append((event, lane.name))
+            now = time.monotonic()
+            deadline = deadline if deadline is not None else lane.deadline
+            lane.entries.append((now, now + deadline if deadline is not None else None, event, sequence))
+            self._size += 1
+            self._unfinished += 1
+            self._idle.clear()
+            self._metrics.enqueued += 1
+            if self._size > self._metrics.max_depth:
+                self._metrics.max_depth = self._size
+            condition.notify_all()
 
-    async def shutdown(self):
-        if self.processing_task:
-            self.processing_task.cancel()
+        self.start()
+        if committed is not None and self.wal.sync_commit:
+            await committed
+        return True
+
+    async def recover(self):
+        """
+        Queues the events the WAL holds unacknowledged from a previous run, in
+        their original order and lanes. Deadlines start over. Returns how many.
+        """
+        if self.wal is None:
+            return 0
+        records = self.wal.replay()
+        if records:
+            Event.advance_ids(max(event.id for _, (event, _) in records))
+        for sequence, (event, lane_name) in records:
+            await self._enqueue(event, self.lanes.get(lane_name) or self.lane_for(event), None, sequence)
+        self.logger.info(f"Recovered {len(records)} events from the WAL")
+        return len(records)
+
+    def _ack(self, sequence):
+        if sequence is not None and self.wal is not None:
+            self.wal.ack(sequence)
+
+    def _discard(self, sequence=None):
+        # Bookkeeping for an event that leaves the queue without being handled
+        self._size -= 1
+        self._task_done(sequence)
+
+    def _task_done(self, sequence=None):
+        self._ack(sequence)
+        self._unfinished -= 1
+        if self._unfinished == 0:
+            self._idle.set()
+
+    def _pick_lane(self, now):
+        waiting = [lane for lane in self.lanes.values() if lane.entries]
+        if not waiting:
+            return None
+        if self._weighted_picks >= self.starvation_every:
+            # The stale lane is exempt; its events are only meant to run when nothing else is waiting
+            starving = [lane for lane in waiting if lane.name != STALE_LANE and now - lane.entries[0][0] >= self.starvation_after]
+            if starving:
+                self._weighted_picks = 0
+                return max(starving, key=lambda lane: now - lane.entries[0][0])
+        weighted = [lane for lane in waiting if lane.weight > 0]
+        if not weighted:
+            return waiting[0]  # Only the stale lane has work
+        total = 0
+        chosen = None
+        for lane in weighted:
+            lane.credit += lane.weight
+            total += lane.weight
+            if chosen is None or lane.credit > chosen.credit:
+                chosen = lane
+        chosen.credit -= total
+        self._weighted_picks += 1
+        return chosen
+
+    def _next_entry(self):
+        # Pops the next event to handle, expiring stale ones on the way. Caller holds the condition
+        while True:
+            now = time.monotonic()
+            lane = self._pick_lane(now)
+            if lane is None:
+                return None
+            entry = lane.entries.popleft()
+            enqueued_at, expires_at, event, sequence = entry
+            if expires_at is not None and now > expires_at and lane.name != STALE_LANE:
+                lane.expired += 1
+                self._metrics.expired += 1
+                if lane.on_expired == DEPRIORITIZE:
+                    self.lanes[STALE_LANE].entries.append(entry)
+                else:
+                    self._discard(sequence)
+                    self.logger.warning(f'Dropped event {event.id}: it expired after {now - enqueued_at:.3f}s in lane {lane.name}')
+                continue
+            self._size -= 1
+            wait = now - enqueued_at
+            lane.wait.observe(wait)
+            self._metrics.wait.observe(wait)
+            return event, sequence
+
+    async def _get(self):
+        condition = self._sync_primitives()
+        async with condition:
+            while True:
+                await condition.wait_for(lambda: self._size > 0)
+                entry = self._next_entry()
+                condition.notify_all()  # Room for blocked producers, even if everything had expired
+                if entry is not None:
+                    return entry
+
+    def start(self):
+        # Starts the worker pool if it isn't running; needs a running event loop
+        self._sync_primitives()
+        self.workers = [worker for worker in self.workers if not worker.done()]
+        for _ in range(self.num_workers - len(self.workers)):
+            self.workers.append(asyncio.create_task(self._work()))
+
+    async def _work(self):
+        while True:
+            event, sequence = await self._get()
+            pending = None
             try:
-                await self.processing_task
+                pending = await self.process_event(event)
             except asyncio.CancelledError:
-                pass
-        self.logger.info('Event processing loop has been stopped.')
+                # Cancelled mid-handling by shutdown; the event stays unacknowledged for replay
+                sequence = None
+                raise
+            finally:
+                # Events waiting on a batch or a retry are finished when it completes
+                if pending is not None:
+                    pending.add_done_callback(lambda _, sequence=sequence: self._task_done(sequence))
+                else:
+                    self._task_done(sequence)
 
-    async def process_single_event(self, event, handler):
+    def _spawn(self, coroutine):
+        task = asyncio.get_running_loop().create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _call(self, event, handler):
+        # Returns the exception the handler raised, or None
         try:
-            await handler.handle(event)
+            result = handler.handle_event(event, self.owner)
+            if inspect.isawaitable(result):
+                await result
             self.logger.info(f"Event {event.id} processed successfully by handler {type(handler).__name__}")
+            return None
         except Exception as e:
             self.logger.error(f"Error processing event {event.id} with handler {type(handler).__name__}: {str(e)}", exc_info=True)
+            return e
+
+    async def process_single_event(self, event, handler):
+        return await self._call(event, handler) is None
+
+    def retry_policy_for(self, handler):
+        return getattr(handler, 'retry_policy', None) or self.retry_policy
+
+    def _retry_later(self, event, handler, attempt, error, outcome):
+        # attempt is the number of tries made so far; outcome resolves once the handler succeeds or gives up
+        policy = self.retry_policy_for(handler)
+        if not policy.should_retry(attempt):
+            self._dead_letter(event, handler, attempt, error)
+            outcome.set_result(False)
+            return
+        self._metrics.retried += 1
+        self.timers.schedule(policy.delay(attempt), lambda: self._spawn(self._retry(event, handler, attempt + 1, outcome)))
+
+    async def _retry(self, event, handler, attempt, outcome):
+        error = await self._call(event, handler)
+        if error is None:
+            outcome.set_result(True)
+        else:
+            self._retry_later(event, handler, attempt, error, outcome)
+
+    def _dead_letter(self, event, handler, attempts, error):
+        exceeded = RetryExceededError(f"{type(handler).__name__} failed on event {event.id}", attempts=attempts, error=repr(error))
+        exceeded.__cause__ = error
+        self.dead_letters.add(DeadLetter(event, handler, attempts, exceeded))
+        self._metrics.dead_lettered += 1
+        self.logger.warning(f"Event {event.id} dead-lettered after {attempts} attempts by {type(handler).__name__}")
+
+    async def replay_dead_letters(self, predicate=None):
+        """
+        Runs the failed handler again for every dead letter matching the
+        predicate (all of them by default), with a fresh set of retries.
+        Returns how many were replayed; join() waits for them to finish.
+        """
+        self._sync_primitives()
+        letters = self.dead_letters.take(predicate)
+        loop = asyncio.get_running_loop()
+        for letter in letters:
+            self._unfinished += 1
+            self._idle.clear()
+            if hasattr(letter.handler, 'handle_batch'):
+                outcome = await self._batcher(letter.handler).submit(letter.event)
+            else:
+                outcome = loop.create_future()
+                self._spawn(self._retry(letter.event, letter.handler, 1, outcome))
+            outcome.add_done_callback(lambda _: self._task_done())
+        self.logger.info(f"Replaying {len(letters)} dead-lettered events")
+        return len(letters)
+
+    def _batcher(self, handler):
+        batcher = self._batchers.get(id(handler))
+        if batcher is None:
+            batcher = self._batchers[id(handler)] = Batcher(handler, self)
+        return batcher
+
+    async def process_event(self, event):
+        """
+        Runs the event's handlers. Handlers with a handle_batch method only
+        get the event queued into their next batch, waiting if that batch is
+        already full, and failed handlers are scheduled for retry. In either
+        case the future returned completes once every handler has finished
+        with the event.
+        """
+        handlers = self.event_handlers.get(type(event), [])
+        if not handlers:
+            self.logger.warning(f"No handler registered for event {type(event).__name__}, ID: {event.id}")
+            return None
+        started = time.monotonic()
+        direct = [handler for handler in handlers if not hasattr(handler, 'handle_batch')]
+        errors = await asyncio.gather(*(self._call(event, handler) for handler in direct))
+
+        outcomes = []
+        for handler, error in zip(direct, errors):
+            if error is not None:
+                outcome = asyncio.get_running_loop().create_future()
+                self._retry_later(event, handler, 1, error, outcome)
+                outcomes.append(outcome)
+        for handler in handlers:
+            if hasattr(handler, 'handle_batch'):
+                outcomes.append(await self._batcher(handler).submit(event))
+        if not outcomes:
+            self._record(started, [True])
+            return None
+        pending = asyncio.gather(*outcomes)
+        pending.add_done_callback(lambda future: self._record(started, future.result()))
+        return pending
+
+    def _record(self, started, results):
+        self._metrics.handling.observe(time.monotonic() - started)
+        if all(results):
+            self._metrics.processed += 1
+        else:
+            self._metrics.failed += 1
+
+    async def join(self):
+        self._sync_primitives()
+        await self._idle.wait()
 
     async def process_events(self):
-        while not self.event_queue.empty():
-            event = await self.event_queue.get()
-            handlers = self.event_handlers.get(type(event), [])
-            if not handlers:
-                self.logger.warning(f"No handler registered for event {type(event).__name__}, ID: {event.id}")
-                self.event_queue.task_done()
-                continue
-            handler_coroutines = [self.process_single_event(event, handler) for handler in handlers]
+        # Makes sure the workers are running and waits until everything queued so far is handled
+        self.start()
+        await self.join()
+
+    async def shutdown(self, drain=True, timeout=None):
+        """
+        Stops accepting events and stops the workers. With drain=True the
+        workers first finish what's queued, giving up after timeout seconds.
+        Events still unhandled stay unacknowledged in the WAL, if there is one.
+        """
+        self.accepting = False
+        if drain and self.workers:
             try:
-                await asyncio.gather(*handler_coroutines)
-                self.event_queue.task_done()
-            except Exception as e:
-                self.logger.error(f"Error processing event {event.id}: {str(e)}", exc_info=True)
-                self.event_queue.task_done()
-                continue
+                await asyncio.wait_for(self.join(), timeout)
+            except asyncio.TimeoutError:
+                self.logger.warning(f'Shutdown timed out with {self._size} events still queued and {len(self.timers)} retries pending.')
+        self.timers.stop()
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+        if self.wal is not None:
+            await self.wal.close()
         self.logger.info('Event processing loop has been stopped.')
 
+    def metrics(self):
+        metrics = self._metrics.snapshot(self._size)
+        metrics['lanes'] = {name: lane.snapshot() for name, lane in self.lanes.items()}
+        metrics['dead_letters'] = len(self.dead_letters)
+        if self.wal is not None:
+            metrics['wal_unacked'] = len(self.wal)
+        return metrics
+
     def __repr__(self):
-        return f"EventQueue(id={self.id}, queue_size={self.event_queue.qsize()})"
+        return f"EventQueue(id={self.id}, queue_size={self._size})"
 
     def __str__(self):
         return self.__repr__()
-
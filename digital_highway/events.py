@@ -1,10 +1,13 @@
+import time
 from datetime import datetime
 from abc import ABC
+from itertools import count
 from typing import Dict, Any
-from utils import generate_unique_id
 
 
 class EventLog:
+    __slots__ = ('history',)
+
     def __init__(self):
         self.history = []
 
@@ -39,27 +42,27 @@ class EventLog:
         return other + self.history
 
 class Event(ABC):
-    def __init__(self, payload: str):
-        self._id = generate_unique_id()
-        self._payload = payload
-        self._timestamp = datetime.now()
-        self._log = EventLog()
-        self._metadata: Dict[str, Any] = {}
+    """
+    Base class for everything that travels through an EventQueue.
 
-    @property
-    def log(self):
-        return self._log.history
+    Events are created at high rates, so they're slotted. The id comes from a
+    process-wide integer counter and the timestamp is kept as integer
+    nanoseconds since the epoch. The log and metadata are only allocated the
+    first time something is written to them.
+    """
+    __slots__ = ('_id', '_payload', '_timestamp_ns', '_log', '_metadata')
 
+    _ids = count(1)
 
-class Event(ABC):
     def __init__(self, payload: str):
-        self._id = generate_unique_id()
+        self._id = next(Event._ids)
         self._payload = payload
-        self._timestamp = datetime.now()
-        self._metadata: Dict[str, Any] = {}
+        self._timestamp_ns = time.time_ns()
+        self._log = None
+        self._metadata = None
 
     @property
-    def id(self) -> str:
+    def id(self) -> int:
         return self._id
 
     @property
@@ -68,16 +71,39 @@ class Event(ABC):
 
     @property
     def timestamp(self) -> datetime:
-        return self._timestamp
+        return datetime.fromtimestamp(self._timestamp_ns / 1e9)
+
+    @property
+    def timestamp_ns(self) -> int:
+        return self._timestamp_ns
+
+    @property
+    def log(self):
+        return self._log.history if self._log is not None else []
+
+    def add_log_entry(self, entry) -> None:
+        if self._log is None:
+            self._log = EventLog()
+        self._log.add_entry(entry)
 
     @property
     def metadata(self) -> Dict[str, Any]:
+        if self._metadata is None:
+            self._metadata = {}
         return self._metadata
 
     def add_metadata(self, key: str, value: Any) -> None:
-        self._metadata[key] = value
+        self.metadata[key] = value
+
+    @classmethod
+    def advance_ids(cls, past):
+        # Called when events from a previous run are recovered, so new events never reuse their ids
+        next_id = next(Event._ids)
+        Event._ids = count(max(next_id, past + 1))
 
 class MessageEvent(Event):
+    __slots__ = ('_sender',)
+
     def __init__(self, message: str, sender: str):
         super().__init__(message)
         self._sender = sender
@@ -87,6 +113,8 @@ class MessageEvent(Event):
         return self._sender
 
 class CommandEvent(Event):
+    __slots__ = ('_target', '_params')
+
     def __init__(self, command: str, target: str, params: Dict[str, Any] = None):
         super().__init__(command)
         self._target = target
@@ -101,6 +129,8 @@ class CommandEvent(Event):
         return self._params
 
 class TestEvent(Event):
+    __slots__ = ('_source', '_target')
+
     def __init__(self, source, test_data, target):
         super().__init__(test_data)
         self._source = source
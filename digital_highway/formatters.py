@@ -1,17 +1,19 @@
 import json
 
 class BaseFormatter:
-    def __init__(self, sender):
+    # A formatter built without a sender can be shared, e.g. by every bot from one BotTemplate,
+    # with each bot passing itself to format()
+    def __init__(self, sender=None):
         self.sender = sender
 
-    def format(self, data):
+    def format(self, data, sender=None):
         raise NotImplementedError
 
 
 class JSONFormatter(BaseFormatter):
-    def format(self, data):
+    def format(self, data, sender=None):
         formatted_data = {
-            'sender': self.sender,
+            'sender': sender if sender is not None else self.sender,
             'data': data,
         }
         return json.dumps(formatted_data)
\ No newline at end of file
@@ -1,5 +1,9 @@
+import weakref
 import functools
+import threading
 from abc import ABC, abstractmethod
+from collections import Counter
+from types import MappingProxyType
 from typing import Dict, Type, List, Any
 from datetime import datetime
 from events import Event, MessageEvent, CommandEvent
@@ -9,14 +13,14 @@ class Handler(ABC):
     def __init__(self, config: Dict[str, Any] = None):
         self.id = generate_unique_id()
         self._config = config
-        self._logger = setup_logger(self)
+        self.logger = setup_logger(self)
 
         if config:
             run_config(self, config)
 
-    @abstractmethod
     def handle_event(self, event: Event, bot):
-        pass
+        # Most handlers only implement handle(); none of them could be instantiated while this was abstract
+        return self.handle(event)
 
 class HandlerFactory(Handler):
     def __init__(self, config: Dict[str, Any] = None):
@@ -42,7 +46,84 @@ class HandlerFactory(Handler):
 
         return handlers
 
-
+class DispatchTable:
+    """
+    Immutable, shareable routing from a message type to its handler.
+
+    Routes are compiled once, when the table is built, from the types listed
+    in each handler's handled_types. Handlers that only have a can_handle()
+    predicate form a fallback chain. The chain is tried in order for types
+    with no route. One default table is shared by every port in the process,
+    see DispatchTable.default().
+
+    Tables are never modified after they are built. with_handlers() layers
+    overrides on top of a table and returns the new table, leaving the
+    original as it was. Lookups go through the layer's own routes, then the
+    routes below it, then the fallback chains in the same order. Results are
+    cached per table, so a resolve is still a single dict lookup once a type
+    has been seen. Types that nothing handles are counted in `unhandled`.
+    """
+    _default = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, handlers=(), parent=None):
+        routes = {}
+        fallbacks = []
+        # Accepts the dict HandlerFactory.create_handlers() returns, as well as any iterable of handlers
+        for handler in handlers.values() if isinstance(handlers, dict) else handlers:
+            handled_types = getattr(handler, 'handled_types', None)
+            if handled_types is not None:
+                for handled_type in handled_types:
+                    routes.setdefault(handled_type, handler)  # The first handler given for a type wins
+            elif hasattr(handler, 'can_handle'):
+                fallbacks.append(handler)
+            # Anything else is an event handler, which doesn't route by message type
+        self.parent = parent
+        self._routes = MappingProxyType(routes)  # message type -> handler, this layer only
+        self._fallbacks = tuple(fallbacks)
+        self._resolved = {}  # message type -> handler, cache over all layers
+        self.unhandled = Counter()
+
+    @classmethod
+    def default(cls):
+        if cls._default is None:
+            with cls._default_lock:
+                if cls._default is None:
+                    cls._default = cls(HandlerFactory.create_handlers())
+        return cls._default
+
+    def with_handlers(self, handlers):
+        return DispatchTable(handlers, parent=self)
+
+    def _layers(self):
+        table = self
+        while table is not None:
+            yield table
+            table = table.parent
+
+    def _lookup(self, message_type):
+        for table in self._layers():
+            handler = table._routes.get(message_type)
+            if handler is not None:
+                return handler
+        for table in self._layers():
+            for fallback in table._fallbacks:
+                if fallback.can_handle(message_type):
+                    return fallback
+        return None
+
+    def resolve(self, message_type):
+        handler = self._resolved.get(message_type)
+        if handler is None:
+            handler = self._lookup(message_type)
+            if handler is None:
+                self.unhandled[message_type] += 1
+                return None
+            self._resolved[message_type] = handler
+        return handler
+
+    def __contains__(self, message_type):
+        return message_type in self._resolved or self._lookup(message_type) is not None
 
 class TypeHandler(Handler):
     @staticmethod
@@ -55,6 +136,8 @@ class TypeHandler(Handler):
         raise NotImplementedError("This method should be overridden in subclass")
 
 class CommandHandler(TypeHandler):
+    handled_types = ('CommandEvent',)
+
     def __init__(self, config: Dict[str, Any] = None):
         super().__init__(config)
 
@@ -64,9 +147,11 @@ class CommandHandler(TypeHandler):
 
     def handle(self, event: CommandEvent):
         self.logger.info(f"Command Event Received. Command: {event.payload}")
-        event._log.add_entry("CommandEvent was processed.")
+        event.add_log_entry("CommandEvent was processed.")
 
 class MessageHandler(TypeHandler):
+    handled_types = ('MessageEvent',)
+
     def __init__(self, config: Dict[str, Any] = None):
         super().__init__(config)
 
@@ -77,7 +162,7 @@ class MessageHandler(TypeHandler):
     def handle(self, event: MessageEvent):
         assert isinstance(event, MessageEvent), "Event must be an instance of MessageEvent."
         self.logger.info(f"Message Event Received. Content: {event.payload}")
-        event._log.add_entry("MessageEvent was processed.")
+        event.add_log_entry("MessageEvent was processed.")
 
 import logging
 
@@ -136,41 +221,124 @@ class GeneralHandler(TypeHandler):
         self.logger.info(f"Received a TypeHandler in GeneralHandler")
         return f"GeneralHandler received a TypeHandler: {stuff}"
 
+# Handler lifecycles for EventHandler: one instance per process, per bot, or per event
+SINGLETON = 'singleton'
+PER_BOT = 'per_bot'
+PER_EVENT = 'per_event'
+HANDLER_SCOPES = (SINGLETON, PER_BOT, PER_EVENT)
+
 class EventHandler(Handler):
+    scope = SINGLETON  # Scope of the handlers generated for each event type
+    # Subclasses that define handle_batch(events, bot) get events from EventQueue in batches of up
+    # to max_batch_size, waiting at most max_linger seconds for a batch to fill
+    max_batch_size = 100
+    max_linger = 0.01
+    retry_policy = None  # A retry.RetryPolicy; None uses the EventQueue's
+
     def __init__(self, config: Dict[str, Any] = None):
         super().__init__(config)
         if not hasattr(self, 'handlers'):
-            self.handlers = {}
+            self.handlers = {}  # event type name -> handler class
+        if not hasattr(self, 'scopes'):
+            self.scopes = {}  # event type name -> scope, overriding the handler class's
+        self._instances = {}  # event type name -> handler, for singletons
+        self._bot_instances = weakref.WeakKeyDictionary()  # bot -> event type name -> handler
+        self._instances_lock = threading.Lock()
+
+    def register(self, event_type: str, handler_class, scope: str = None):
+        if scope is not None:
+            self.set_scope(event_type, scope)
+        self.handlers[event_type] = handler_class
+        self._forget(event_type)
+
+    def set_scope(self, event_type: str, scope: str):
+        if scope not in HANDLER_SCOPES:
+            raise ValueError(f"Unknown handler scope '{scope}'. Expected one of {HANDLER_SCOPES}")
+        self.scopes[event_type] = scope
+        self._forget(event_type)
+
+    def _forget(self, event_type):
+        # Cached instances were built for the old class or scope
+        with self._instances_lock:
+            self._instances.pop(event_type, None)
+            for instances in self._bot_instances.values():
+                instances.pop(event_type, None)
+
+    def _handler_class(self, event_type):
+        handler_class = self.handlers.get(event_type)
+        if handler_class is None:
+            self.logger.info(f"Creating new handler for event type {event_type}")
+            handler_class = type(f"{event_type}Handler", (EventHandler,), {})
+            handler_class.handle = self.generate_handle_method(event_type)
+            self.handlers[event_type] = handler_class
+        return handler_class
+
+    def get_handler(self, event_type: str, bot=None):
+        """
+        Returns the handler for an event type, reusing a cached instance unless
+        the type's scope is per-event. Per-bot handlers without a bot fall back
+        to the singleton.
+        """
+        handler_class = self._handler_class(event_type)
+        scope = self.scopes.get(event_type, handler_class.scope)
+        if scope == PER_EVENT:
+            return handler_class()
+
+        instances = self._instances
+        if scope == PER_BOT and bot is not None:
+            instances = self._bot_instances.get(bot)
+            if instances is None:
+                with self._instances_lock:
+                    instances = self._bot_instances.setdefault(bot, {})
+        handler = instances.get(event_type)
+        if handler is None:
+            with self._instances_lock:
+                handler = instances.setdefault(event_type, handler_class())
+        return handler
 
-    def handle(self, event: Event):
+    def handle_event(self, event: Event, bot):
+        return self.handle(event, bot)
+
+    def handle(self, event: Event, bot=None):
         if not isinstance(event, Event):
             raise TypeError("Provided event is not an instance of the Event class.")
 
-        event_type = type(event).__name__
-        if event_type not in self.handlers:
-            self.logger.info(f"Creating new handler for event type {event_type}")
-            new_handler_class = type(f"{event_type}Handler", (EventHandler,), {})
-            new_handler_class.handle = self.generate_handle_method(event_type)
-            self.handlers[event_type] = new_handler_class
+        handler = self.get_handler(type(event).__name__, bot)
+        handler.handle(event, bot)
 
-        handler = self.handlers[event_type]()
-        handler.handle(event)
-
-        event._log.add_entry(f"Event handled by {type(handler).__name__}")
+        event.add_log_entry(f"Event handled by {type(handler).__name__}")
 
     def generate_handle_method(self, event_type: str):
-        def handle(self, event):
+        def handle(self, event, bot=None):
             self.logger.info(f"Handling {event_type}. Content: {event.payload}")
         return handle
 
 class MessageEventHandler(EventHandler):
-    def handle(self, event: MessageEvent):
+    def handle(self, event: MessageEvent, bot=None):
         assert isinstance(event, MessageEvent), "Event must be an instance of MessageEvent."
         self.logger.info(f"Message Event Received. Content: {event.payload}")
-        event._log.add_entry("MessageEvent was processed.")
+        event.add_log_entry("MessageEvent was processed.")
 
 class CommandEventHandler(EventHandler):
-    def handle(self, event: CommandEvent):
+    def handle(self, event: CommandEvent, bot=None):
         assert isinstance(event, CommandEvent), "Event must be an instance of CommandEvent."
         self.logger.info(f"Command Event Received. Command: {event.payload}")
-        event._log.add_entry("CommandEvent was processed.")
\ No newline at end of file
+        event.add_log_entry("CommandEvent was processed.")
+
+if __name__ == '__main__':
+    # A per-bot handler gets the bot it's scoped to
+    class Bot:
+        pass
+
+    class RecordingHandler(EventHandler):
+        def handle(self, event, bot=None):
+            self.bots = getattr(self, 'bots', []) + [bot]
+
+    dispatcher = EventHandler()
+    dispatcher.register('MessageEvent', RecordingHandler, scope=PER_BOT)
+    first, second = Bot(), Bot()
+    dispatcher.handle(MessageEvent('hello', 'sender'), first)
+    dispatcher.handle(MessageEvent('hello', 'sender'), second)
+    assert dispatcher.get_handler('MessageEvent', first).bots == [first], "Per-bot handlers should get their bot"
+    assert dispatcher.get_handler('MessageEvent', second).bots == [second], "Per-bot handlers should get their bot"
+    print("All tests pass.")
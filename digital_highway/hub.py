@@ -1,6 +1,8 @@
 from bot import Bot
+from config import BotTemplate
 from port import Port
 import utils
+import names
 from message import Message
 import uuid
 import asyncio
@@ -133,10 +135,24 @@ class Hub(Bot):
         print(f"Hub received data from {source.id}: {data}")
 
     def create_bots(self, num_bots):
-        for i in range(num_bots):
-            bot = Bot()
+        for name in names.generate_names(num_bots):
+            bot = Bot({'name': name})
             self.add_bot(bot)
 
+    def provision(self, num_bots, template=None):
+        # Bulk version of create_bots: one validated template whose handler table, formatter and
+        # message handler every bot shares, and a single batch of connection registrations
+        if not isinstance(template, BotTemplate):
+            template = BotTemplate(template)
+
+        bots = [template.build(name) for name in names.generate_names(num_bots)]
+        accepted = [bot for bot in bots if self._check_rules(bot)]
+        self.bots.update(accepted)
+        self.port.connect_many([bot.port for bot in accepted])
+
+        self.logger.info(f"Provisioned {len(accepted)} of {num_bots} bots for hub {self.id}")
+        return accepted
+
     def identify(self):
         print(f"Hub {self.port.address} identified")
 
@@ -159,6 +175,23 @@ if __name__ == '__main__':
     # The hub should now have two bots
     assert len(hub.bots) == 2, "Bots were not added correctly"
 
+    # Test provisioning bots in bulk from one template
+    provisioning_hub = Hub()
+    template = BotTemplate({'is_active': False})
+    provisioned = provisioning_hub.provision(50, template)
+    assert len(provisioned) == 50 and provisioning_hub.bots == set(provisioned), "Bots were not provisioned correctly"
+    assert all(not bot.is_active for bot in provisioned), "Template config was not applied"
+    assert all(bot.port._handlers is template.handlers for bot in provisioned), "Bots should share the template's handler table"
+    assert all(bot.formatter is template.formatter and bot.message_handler is template.message_handler for bot in provisioned), "Bots should share the template's formatter and message handler"
+    assert template.build('Ada Lovelace').name == 'Ada Lovelace', "Bots built from a template should keep their names"
+    assert all(bot.port in provisioning_hub.port.get_connections() for bot in provisioned), "Provisioned bots were not connected"
+    try:
+        BotTemplate({'_hashed_password': 'x'})
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("Templates should reject restricted keys")
+
     # Test broadcasting data
     loop = asyncio.get_event_loop()
     loop.run_until_complete(hub.broadcast("Test data"))
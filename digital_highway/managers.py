@@ -1,12 +1,18 @@
-from bot import Bot
+import uuid
 import secrets
-from port import ConnectionRequest
+import threading
+import utils
+from message import Message
+from errors import ConnectionError, InvalidDestinationError
+
+# bot.py imports this module through port.py, so Bot is imported where it's used
 
 class BotManager:
     def __init__(self):
         self.bots = {}
 
     def create_bot(self, bot_id, port):
+        from bot import Bot
         bot = Bot(port)
         self.bots[bot_id] = bot
         return bot
@@ -47,12 +53,22 @@ class BotManager:
         else:
             raise ValueError(f"No bot with id {bot_id} exists")
 
+class ConnectionRequest:
+    def __init__(self, source_port, token, trusted=None):
+        self.source_port = source_port
+        self.token = token # The token is now a string
+        # Trusted requests come from a Port in this process that opted into trusted mode
+        self.trusted = getattr(source_port, 'is_trusted', False) if trusted is None else trusted
+
+    def __str__(self):
+        return f"ConnectionRequest(source_port={self.source_port}, token={self.token}, trusted={self.trusted})"
+
 class ConnectionManager:
     def __init__(self, port):
         self.port = port
         self.connections = set()
 
-    async def connect(self, target):
+    def connect(self, target, token=None):
         if target in self.connections:
             raise ConnectionError(f"{target.__class__.__name__ + ' ' + target.id} is already connected to Port {self.port.address}")
         elif target is None:
@@ -60,17 +76,30 @@ class ConnectionManager:
         elif target is self.port:
             raise ConnectionError(f"Cannot connect Port {self.port.address} to itself.")
         else:
-            # Create a connection request with a token
-            token = secrets.token_hex(16)
+            # Create a connection request with the given credentials, or a throwaway token
+            # that only a trusted target will accept
+            token = token or secrets.token_hex(16)
             request = ConnectionRequest(self.port, token)
-            if await target.handle_connection_request(request):
+            if target.handle_connection_request(request):
                 self.connections.add(target)
                 self.port.logger.info(f"{target.__class__.__name__ + ' ' + target.id} has been connected to Port {self.port.address}")
             else:
                 raise ConnectionError(f"Could not connect {target.__class__.__name__ + ' ' + target.id} to Port {self.port.address}.")
         return self
 
-    async def disconnect(self, target):
+    def connect_many(self, targets, token=None):
+        token = token or secrets.token_hex(16)
+        accepted = []
+        for target in targets:
+            if target is None or target is self.port or target in self.connections:
+                continue
+            if target.handle_connection_request(ConnectionRequest(self.port, token)):
+                accepted.append(target)
+        self.connections.update(accepted)
+        self.port.logger.info(f"{len(accepted)} of {len(targets)} targets have been connected to Port {self.port.address}")
+        return accepted
+
+    def disconnect(self, target):
         if target in self.connections:
             self.connections.remove(target)
             self.port.logger.info(f"{target.__class__.__name__ + ' ' + target.id} has been disconnected from Port {self.port.address}")
@@ -78,3 +107,37 @@ class ConnectionManager:
             raise ConnectionError(f"{target.__class__.__name__ + ' ' + target.id} is not connected to Port {self.port.address}")
         return self
 
+
+class MessageManager:
+    _DEFAULT_CONFIG = {
+        'id': lambda: str(uuid.uuid4()),
+        'lock': lambda: threading.Lock(),
+        '_port': None,
+        '_messages': lambda: set(),
+        '_logger_level': 'DEBUG'
+    }
+
+    def __init__(self, port):
+        utils.run_default_config(self, self._DEFAULT_CONFIG)
+        self._port = port
+        self.logger = utils.setup_logger(self)
+        self.logger.info(f'Initialized {self.__class__.__name__} {self.id} for Port {self._port.id}')
+
+    def receive(self, message: Message):
+        if not isinstance(message, Message):
+            raise TypeError("The 'message' parameter should be an instance of the 'Message' class.")
+        with self.lock:  # Acquire the lock
+            self._messages.add(message)
+            self.logger.info(f'Message received at Port {self._port.id}.')
+
+    def send(self, content, destinations):
+        if not isinstance(destinations, (list, tuple, set)):
+            destinations = [destinations]  # Encapsulate single destination in list for compatibility
+
+        for destination in destinations:
+            if destination in self._port._connection_manager.connections:
+                message = Message(source=self._port, content=content, destination=destination)
+                destination.receive(message)
+                self.logger.info(f'Message sent from Port {self._port.id} to {destination.id}.')
+            else:
+                raise InvalidDestinationError(f"Cannot send message. Destination Port {destination.id} is not connected.")
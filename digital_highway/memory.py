@@ -1,29 +1,357 @@
+import os
+import mmap
 import uuid
+import zlib
+import pickle
+import struct
+import threading
 import utils
+from utils import thread_safe_method
+from array import array
+from bisect import bisect_left
+from itertools import compress, count, islice
 
 class MemoryItem:
-    DEFAULT_CONFIG = {
-        'id': lambda: str(uuid.uuid4()),
-    }
+    """
+    A single remembered datum.
 
-    def __init__(self, data):
-        self.run_default_config() # Always run this first
-        self.logger = utils.setup_logger(self, 'DEBUG') # Always run this second
+    Memory items are created in bulk, so they're kept as small as possible:
+    two slots, an integer id from a process-wide counter and no logger.
+    """
+    __slots__ = ('id', 'data')
+
+    _ids = count(1)
+
+    def __init__(self, data, id=None):
+        self.id = next(MemoryItem._ids) if id is None else id
         self.data = data
 
-    def run_default_config(self):
-        for key, default_value_func in self.DEFAULT_CONFIG.items():
-            setattr(self, key, default_value_func())
+    def __eq__(self, other):
+        return isinstance(other, MemoryItem) and self.id == other.id and self.data == other.data
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __repr__(self):
+        return f'MemoryItem(id={self.id}, data={self.data!r})'
+
+    @classmethod
+    def advance_ids(cls, past):
+        # Persistent tiers call this on open so new items never reuse a stored id
+        next_id = next(cls._ids)
+        cls._ids = count(max(next_id, past + 1))
+
+class MemoryTier:
+    """
+    Ordered container of MemoryItems keyed by id.
+
+    Behaves like the list it replaces (append, remove, `in`, iteration,
+    indexing from either end), but membership tests and removals are O(1)
+    because items are stored in an insertion-ordered dict.
+    """
+    def __init__(self, name):
+        self.name = name
+        self._items = {}
+
+    def append(self, memory_item):
+        self._items[memory_item.id] = memory_item
+
+    def remove(self, memory_item):
+        del self._items[memory_item.id]
+
+    def get(self, memory_item_id):
+        return self._items.get(memory_item_id)
+
+    def ids(self):
+        return self._items.keys()
+
+    def clear(self):
+        self._items.clear()
+
+    def __contains__(self, memory_item):
+        return getattr(memory_item, 'id', None) in self._items
+
+    def __iter__(self):
+        return iter(self._items.values())
+
+    def __len__(self):
+        return len(self._items)
+
+    def __getitem__(self, index):
+        # The ends are O(1); anything in the middle has to walk the tier
+        if not self._items:
+            raise IndexError(f'{self.name} index out of range')
+        if index == -1:
+            return next(reversed(self._items.values()))
+        if index == 0:
+            return next(iter(self._items.values()))
+        if index < 0:
+            index += len(self._items)
+        if not 0 <= index < len(self._items):
+            raise IndexError(f'{self.name} index out of range')
+        return next(islice(self._items.values(), index, None))
+
+    def __eq__(self, other):
+        if isinstance(other, MemoryTier):
+            other = list(other)
+        return list(self) == other
+
+    def __repr__(self):
+        return repr(list(self._items.values()))
+
+class ColumnarMemoryTier:
+    """
+    Bulk storage tier that keeps memories as columns instead of objects.
+
+    Ids live in a sorted array of 64-bit ints and are looked up by binary
+    search, so there is no per-item index. Data lives in a list, or in a
+    typed array when a typecode is given (e.g. 'd' for floats). MemoryItems
+    are only built when an item is read back. Items are kept in id order,
+    which is the order they were created in; appending an older item
+    inserts it in place. Removed items are tombstoned in a byte per item and
+    the columns are compacted once more than half of them are dead. It has
+    the same interface as MemoryTier, so it can stand in for any tier:
+    Memory({'long_term': ColumnarMemoryTier('long_term')})
+    """
+    def __init__(self, name, typecode=None):
+        self.name = name
+        self._ids = array('q')
+        self._data = array(typecode) if typecode else []
+        self._live = bytearray()  # 1 per item, 0 once it's removed
+        self._dead = 0
+
+    def _find(self, memory_item_id):
+        # Position of a live item, or None
+        if not isinstance(memory_item_id, int):
+            return None
+        position = bisect_left(self._ids, memory_item_id)
+        if position < len(self._ids) and self._ids[position] == memory_item_id and self._live[position]:
+            return position
+        return None
+
+    def append(self, memory_item):
+        memory_item_id = memory_item.id
+        if not self._ids or memory_item_id > self._ids[-1]:
+            self._ids.append(memory_item_id)
+            self._data.append(memory_item.data)
+            self._live.append(1)
+            return
+        position = bisect_left(self._ids, memory_item_id)
+        if position < len(self._ids) and self._ids[position] == memory_item_id:
+            if not self._live[position]:
+                self._live[position] = 1
+                self._dead -= 1
+            self._data[position] = memory_item.data
+            return
+        self._ids.insert(position, memory_item_id)
+        self._data.insert(position, memory_item.data)
+        self._live.insert(position, 1)
+
+    def remove(self, memory_item):
+        position = self._find(memory_item.id)
+        if position is None:
+            raise KeyError(memory_item.id)
+        self._live[position] = 0
+        self._dead += 1
+        if self._dead > len(self._ids) // 2:
+            self._compact()
+
+    def _compact(self):
+        self._ids = array('q', compress(self._ids, self._live))
+        data = list(compress(self._data, self._live))
+        self._data = array(self._data.typecode, data) if isinstance(self._data, array) else data
+        self._live = bytearray(b'\x01') * len(self._ids)
+        self._dead = 0
+
+    def get(self, memory_item_id):
+        position = self._find(memory_item_id)
+        if position is None:
+            return None
+        return MemoryItem(self._data[position], memory_item_id)
+
+    def ids(self):
+        return compress(self._ids, self._live)
+
+    def clear(self):
+        del self._ids[:]
+        del self._data[:]
+        self._live.clear()
+        self._dead = 0
+
+    def __contains__(self, memory_item):
+        return self._find(getattr(memory_item, 'id', None)) is not None
+
+    def __iter__(self):
+        for memory_item_id, data, live in zip(self._ids, self._data, self._live):
+            if live:
+                yield MemoryItem(data, memory_item_id)
+
+    def __len__(self):
+        return len(self._ids) - self._dead
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f'{self.name} index out of range')
+        return next(islice(iter(self), index, None))
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return f'ColumnarMemoryTier(name={self.name}, items={len(self)})'
 
-    # ... rest of your code ...
+class MappedMemoryTier:
+    """
+    Persistent tier backed by an append-only data file and an offset index.
+
+    Each item's data is pickled and appended to <path>.data. Then a fixed-size
+    (id, offset, length, crc) entry is appended to <path>.index. Removals
+    append a tombstone entry. On open, only the index is read, through an
+    mmap. Items are unpickled one at a time straight from a memory-mapped
+    view of the data file. An interrupted append leaves at most one entry
+    whose record is incomplete. It fails its crc check and is truncated away
+    on the next open. With fsync=True every append is flushed to disk before
+    it returns.
+    Memory({'long_term': MappedMemoryTier('long_term', 'bot.long_term')})
+    """
+    _ENTRY = struct.Struct('<qqII')  # id, offset (-1 for a tombstone), length, crc32
+
+    def __init__(self, name, path, fsync=False):
+        self.name = name
+        self.path = path
+        self.fsync = fsync
+        self._positions = {}  # memory item id -> (offset, length) in the data file
+        self._data_mmap = None
+        self._data_file = open(f'{path}.data', 'a+b')
+        self._index_file = open(f'{path}.index', 'a+b')
+        self._load()
+
+    def _load(self):
+        entry_size = self._ENTRY.size
+        index_size = os.fstat(self._index_file.fileno()).st_size // entry_size * entry_size
+        data_size = os.fstat(self._data_file.fileno()).st_size
+        data_end = 0
+        last_entry = None
+        if index_size:
+            with mmap.mmap(self._index_file.fileno(), index_size, access=mmap.ACCESS_READ) as index:
+                for last_entry in self._ENTRY.iter_unpack(index):
+                    memory_item_id, offset, length, crc = last_entry
+                    if offset < 0:
+                        self._positions.pop(memory_item_id, None)
+                    else:
+                        self._positions[memory_item_id] = (offset, length)
+                        data_end = offset + length  # Appends only ever move forward
+
+        if last_entry is not None and last_entry[1] >= 0 and not self._is_intact(last_entry, data_size):
+            # The last append was interrupted; drop its entry and whatever of its data made it to disk
+            index_size -= entry_size
+            del self._positions[last_entry[0]]
+            data_end = last_entry[1]
+        self._index_file.truncate(index_size)
+        if data_end < data_size:
+            self._data_file.truncate(data_end)
+        if self._positions:
+            MemoryItem.advance_ids(max(self._positions))
+
+    def _is_intact(self, entry, data_size):
+        memory_item_id, offset, length, crc = entry
+        if offset + length > data_size:
+            return False
+        self._data_file.seek(offset)
+        return zlib.crc32(self._data_file.read(length)) == crc
+
+    def _view(self, offset, length):
+        if self._data_mmap is None or offset + length > len(self._data_mmap):
+            if self._data_mmap is not None:
+                self._data_mmap.close()
+            self._data_file.flush()
+            self._data_mmap = mmap.mmap(self._data_file.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self._data_mmap)[offset:offset + length]
+
+    def _write_entry(self, entry):
+        self._index_file.write(self._ENTRY.pack(*entry))
+        self._index_file.flush()
+        if self.fsync:
+            os.fsync(self._index_file.fileno())
+
+    def append(self, memory_item):
+        payload = pickle.dumps(memory_item.data, protocol=pickle.HIGHEST_PROTOCOL)
+        self._data_file.seek(0, os.SEEK_END)
+        offset = self._data_file.tell()
+        self._data_file.write(payload)
+        self._data_file.flush()
+        if self.fsync:
+            os.fsync(self._data_file.fileno())
+        # The data is written before its index entry, so the index never points past it
+        self._write_entry((memory_item.id, offset, len(payload), zlib.crc32(payload)))
+        self._positions[memory_item.id] = (offset, len(payload))
+
+    def remove(self, memory_item):
+        del self._positions[memory_item.id]
+        self._write_entry((memory_item.id, -1, 0, 0))
+
+    def get(self, memory_item_id):
+        position = self._positions.get(memory_item_id)
+        if position is None:
+            return None
+        with self._view(*position) as view:
+            return MemoryItem(pickle.loads(view), memory_item_id)
+
+    def ids(self):
+        return self._positions.keys()
+
+    def clear(self):
+        if self._data_mmap is not None:
+            self._data_mmap.close()
+            self._data_mmap = None
+        self._data_file.truncate(0)
+        self._index_file.truncate(0)
+        self._positions.clear()
+
+    def close(self):
+        if self._data_mmap is not None:
+            self._data_mmap.close()
+            self._data_mmap = None
+        self._data_file.close()
+        self._index_file.close()
+
+    def __contains__(self, memory_item):
+        return getattr(memory_item, 'id', None) in self._positions
+
+    def __iter__(self):
+        for memory_item_id in list(self._positions):
+            yield self.get(memory_item_id)
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f'{self.name} index out of range')
+        return self.get(next(islice(self._positions, index, None)))
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return f'MappedMemoryTier(name={self.name}, path={self.path}, items={len(self)})'
 
 class Memory:
     DEFAULT_CONFIG = {
         'id': lambda: str(uuid.uuid4()),
-        'working_memory': lambda: [],
-        'short_term': lambda: [],
-        'long_term': lambda: [],
-        '_restricted_config_keys': lambda: {'id', 'logger'},
+        'working_memory': lambda: MemoryTier('working_memory'),
+        'short_term': lambda: MemoryTier('short_term'),
+        'long_term': lambda: MemoryTier('long_term'),
+        'archive': lambda: None,  # Optional disk-backed tier below long_term, see consolidation.py
+        'lock': lambda: threading.RLock(),
+        '_index': lambda: {},  # memory item id -> tier holding it (archived items aren't indexed)
+        '_recall_listeners': lambda: [],
+        '_vector_index': lambda: None,  # Built on the first recall_similar, see similarity.py
+        '_restricted_config_keys': lambda: {'id', 'logger', 'lock'},
     }
 
     def __init__(self, config=None):
@@ -33,6 +361,10 @@ class Memory:
         if config:
             self.run_config(config) # Run the config if it exists
 
+        # Persistent tiers can come back with items in them
+        for tier in (self.working_memory, self.short_term, self.long_term):
+            self._index.update(dict.fromkeys(tier.ids(), tier))
+
         self.logger.info(f'Initialized {self.__class__.__name__} {self.id} with config {config}')
 
     def run_default_config(self):
@@ -48,46 +380,118 @@ class Memory:
     def get_memory(self):
         return {'working_memory': self.working_memory, 'short_term': self.short_term, 'long_term': self.long_term}
 
+    def tiers(self):
+        # Hottest first; the archive, if any, sits below long_term
+        tiers = [self.working_memory, self.short_term, self.long_term]
+        if self.archive is not None:
+            tiers.append(self.archive)
+        return tiers
+
+    @thread_safe_method
     def remember(self, data):
         memory_item = MemoryItem(data)
-        if memory_item not in self.working_memory:
+        if memory_item.id not in self._index:
             self.working_memory.append(memory_item)
+            self._index[memory_item.id] = self.working_memory
+            if self._vector_index is not None:
+                self._vector_index.add(memory_item.id, data)
             self.logger.info(f"Added {memory_item} to working memory.")
         else:
             self.logger.warning(f"{memory_item} is already in working memory.")
+        return memory_item
 
-    def commit_to_short_term(self, memory_item):
-        if memory_item in self.working_memory:
-            self.working_memory.remove(memory_item)
-            self.short_term.append(memory_item)
-            self.logger.info(f"Moved {memory_item} from working memory to short-term memory.")
+    def _tier_of(self, memory_item_id):
+        tier = self._index.get(memory_item_id)
+        if tier is None and self.archive is not None and self.archive.get(memory_item_id) is not None:
+            tier = self.archive
+        return tier
+
+    @thread_safe_method
+    def transfer(self, memory_item, target):
+        source = self._tier_of(memory_item.id)
+        if source is None or source is target:
+            return False
+        # Append first: if the target can't store the item (e.g. it won't pickle), it stays where it was
+        target.append(memory_item)
+        source.remove(memory_item)
+        if target is self.archive:
+            # Archived items are looked up in the archive itself so the index stays bounded
+            self._index.pop(memory_item.id, None)
         else:
+            self._index[memory_item.id] = target
+        return True
+
+    def _move(self, memory_item, target):
+        if self._index.get(memory_item.id) is not self.working_memory:
             self.logger.warning(f"Can't move {memory_item}. It's not in working memory.")
+            return False
+        return self.transfer(memory_item, target)
+
+    def commit_to_short_term(self, memory_item):
+        if self._move(memory_item, self.short_term):
+            self.logger.info(f"Moved {memory_item} from working memory to short-term memory.")
 
     def commit_to_long_term(self, memory_item):
-        if memory_item in self.working_memory:
-            self.working_memory.remove(memory_item)
-            self.long_term.append(memory_item)
+        if self._move(memory_item, self.long_term):
             self.logger.info(f"Moved {memory_item} from working memory to long-term memory.")
-        else:
-            self.logger.warning(f"Can't move {memory_item}. It's not in working memory.")
 
+    @thread_safe_method
     def recall(self, memory_item_id):
-        for memory_location in [self.working_memory, self.short_term, self.long_term]:
-            for memory_item in memory_location:
-                if memory_item.id == memory_item_id:
-                    self.logger.info(f"Recalled {memory_item} from memory.")
-                    return memory_item
+        tier = self._tier_of(memory_item_id)
+        if tier is not None:
+            memory_item = tier.get(memory_item_id)
+            for listener in self._recall_listeners:
+                listener(memory_item_id)
+            self.logger.info(f"Recalled {memory_item} from memory.")
+            return memory_item
 
         self.logger.warning(f"Memory with ID {memory_item_id} not found in memory.")
         return None
 
+    def _similarity_index(self):
+        if self._vector_index is None:
+            from similarity import VectorIndex  # numpy is only needed once similarity search is used
+            self._vector_index = VectorIndex()
+            memory_items = [memory_item for tier in self.tiers() for memory_item in tier]
+            self._vector_index.add_many([memory_item.id for memory_item in memory_items], [memory_item.data for memory_item in memory_items])
+        return self._vector_index
+
+    @thread_safe_method
+    def recall_similar(self, query, k=5):
+        """
+        Recalls up to k memories whose data is most similar to the query text,
+        most similar first. Every memory's data is compared by its str().
+        """
+        return self.recall_similar_batch([query], k)[0]
+
+    @thread_safe_method
+    def recall_similar_batch(self, queries, k=5):
+        recalled = []
+        for matches in self._similarity_index().search_batch(queries, k):
+            memory_items = []
+            for memory_item_id, _ in matches:
+                tier = self._tier_of(memory_item_id)
+                if tier is None:
+                    continue
+                memory_items.append(tier.get(memory_item_id))
+                for listener in self._recall_listeners:
+                    listener(memory_item_id)
+            recalled.append(memory_items)
+        self.logger.info(f"Recalled {sum(map(len, recalled))} memories similar to {len(queries)} queries.")
+        return recalled
+
+    @thread_safe_method
     def clear(self):
-        self.working_memory.clear()
-        self.short_term.clear()
-        self.long_term.clear()
+        for tier in self.tiers():
+            tier.clear()
+        self._index.clear()
+        if self._vector_index is not None:
+            self._vector_index.clear()
         self.logger.info("Cleared all memories.")
 
+    def __len__(self):
+        return len(self._index) + (len(self.archive) if self.archive is not None else 0)
+
     def __repr__(self):
         return f'Memory(id={self.id}, working_memory={self.working_memory}, short_term={self.short_term}, long_term={self.long_term})'
 
@@ -115,10 +519,87 @@ def test_memory():
     assert memory.recall(test_memory_item.id).data == 'test_item'
     assert memory.recall(another_test_memory_item.id).data == 'another_test_item'
 
+    # Test recalling by similarity
+    memory.remember('the weather is sunny today')
+    assert [item.data for item in memory.recall_similar('sunny weather', k=1)] == ['the weather is sunny today']
+
     # Test clearing memory
     memory.clear()
     assert memory.get_memory() == {'working_memory': [], 'short_term': [], 'long_term': []}
 
+def test_memory_tier():
+    tier = MemoryTier('test')
+    for index in (0, -1, 1):
+        try:
+            tier[index]
+        except IndexError:
+            pass
+        else:
+            raise AssertionError(f"Indexing an empty tier with {index} should raise IndexError")
+
+    first, middle, last = MemoryItem('first'), MemoryItem('middle'), MemoryItem('last')
+    for memory_item in (first, middle, last):
+        tier.append(memory_item)
+    assert (tier[0], tier[1], tier[-1], tier[-3]) == (first, middle, last, first)
+    tier.remove(middle)
+    assert tier == [first, last] and middle not in tier
+
+def test_columnar_memory_tier():
+    tier = ColumnarMemoryTier('test')
+    first, middle, last = MemoryItem('first'), MemoryItem('middle'), MemoryItem('last')
+    for memory_item in (first, last, middle):
+        tier.append(memory_item)
+    assert list(tier.ids()) == [first.id, middle.id, last.id], "Items should be kept in id order"
+    assert tier.get(middle.id) == middle and tier[-1] == last
+    tier.remove(middle)
+    assert middle not in tier and tier.get(middle.id) is None and len(tier) == 2
+    tier.append(middle)
+    assert tier == [first, middle, last]
+    tier.remove(first)
+    tier.remove(last)
+    assert tier == [middle] and len(tier._ids) == 1, "Columns should be compacted once most items are dead"
+
+def test_mapped_memory_tier():
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'long_term')
+        memory = Memory({'long_term': MappedMemoryTier('long_term', path)})
+        kept = memory.remember({'text': 'kept'})
+        forgotten = memory.remember('forgotten')
+        memory.commit_to_long_term(kept)
+        memory.commit_to_long_term(forgotten)
+        memory.transfer(forgotten, memory.short_term)
+        memory.long_term.close()
+
+        # Simulate a crash halfway through an append
+        with open(f'{path}.data', 'ab') as data_file:
+            data_file.write(b'partial')
+        with open(f'{path}.index', 'ab') as index_file:
+            index_file.write(MappedMemoryTier._ENTRY.pack(10**9, os.path.getsize(f'{path}.data') - 7, 100, 0))
+
+        # A restarted memory finds what was committed, and only that
+        restarted = Memory({'long_term': MappedMemoryTier('long_term', path)})
+        assert restarted.recall(kept.id) == kept
+        assert restarted.recall(forgotten.id) is None
+        assert len(restarted.long_term) == 1
+        assert restarted.remember('new').id > forgotten.id
+
+        # An item the tier can't store stays in working memory instead of being lost
+        unpicklable = restarted.remember(threading.Lock())
+        try:
+            restarted.commit_to_long_term(unpicklable)
+        except TypeError:
+            pass
+        else:
+            raise AssertionError("Committing an unpicklable item should fail")
+        assert restarted.recall(unpicklable.id) is unpicklable
+        assert unpicklable in restarted.working_memory and unpicklable not in restarted.long_term
+        restarted.long_term.close()
+
 if __name__ == "__main__":
     print("Testing Memory class")
     test_memory()
+    test_memory_tier()
+    test_columnar_memory_tier()
+    test_mapped_memory_tier()
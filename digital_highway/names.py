@@ -0,0 +1,57 @@
+import random
+
+# Bundled word lists for bot names, so naming a bot never needs the network.
+
+FIRST_NAMES = (
+    'Ada', 'Alan', 'Alex', 'Ari', 'Basil', 'Bea', 'Cass', 'Cleo', 'Dana', 'Dex',
+    'Eli', 'Emmy', 'Finn', 'Flo', 'Gus', 'Hal', 'Ida', 'Iris', 'Jay', 'Juno',
+    'Kai', 'Kit', 'Lena', 'Lou', 'Max', 'Mira', 'Nell', 'Nico', 'Odo', 'Opal',
+    'Pax', 'Pip', 'Quin', 'Remy', 'Rosa', 'Sage', 'Sol', 'Tess', 'Theo', 'Uma',
+    'Vera', 'Vic', 'Wren', 'Winfo', 'Xan', 'Yara', 'Yuri', 'Zed', 'Zia', 'Zoe',
+)
+
+SURNAMES = (
+    'Abbott', 'Archer', 'Baker', 'Bell', 'Brooks', 'Carver', 'Cole', 'Cross', 'Dale', 'Drake',
+    'Ellis', 'Ember', 'Fairley', 'Finch', 'Fox', 'Gale', 'Grey', 'Hale', 'Hart', 'Holt',
+    'Ives', 'Jett', 'Keane', 'Knox', 'Lake', 'Lark', 'Marsh', 'Moss', 'Nash', 'North',
+    'Oakes', 'Park', 'Pike', 'Quill', 'Reed', 'Rhodes', 'Sparks', 'Stone', 'Swift', 'Thorne',
+    'Vale', 'Vance', 'Wade', 'Ward', 'West', 'Wilde', 'Wolfe', 'York', 'Young', 'Zane',
+)
+
+class NameGenerator:
+    """
+    Deterministic, seedable bot name generator.
+
+    Two generators with the same seed produce the same sequence of names.
+    Without a seed the sequence is random.
+    """
+    def __init__(self, seed=None, first_names=FIRST_NAMES, surnames=SURNAMES):
+        self._random = random.Random(seed)
+        self.first_names = first_names
+        self.surnames = surnames
+
+    def seed(self, seed):
+        self._random.seed(seed)
+
+    def generate(self):
+        return f'{self._random.choice(self.first_names)} {self._random.choice(self.surnames)}'
+
+    def generate_batch(self, count):
+        firsts = self._random.choices(self.first_names, k=count)
+        lasts = self._random.choices(self.surnames, k=count)
+        return [f'{first} {last}' for first, last in zip(firsts, lasts)]
+
+_default_generator = NameGenerator()
+
+def seed(value):
+    _default_generator.seed(value)
+
+def generate_name():
+    return _default_generator.generate()
+
+def generate_names(count):
+    return _default_generator.generate_batch(count)
+
+if __name__ == '__main__':
+    assert NameGenerator(seed=42).generate_batch(5) == NameGenerator(seed=42).generate_batch(5)
+    print(generate_names(5))
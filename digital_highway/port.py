@@ -3,21 +3,15 @@ import bcrypt
 import threading
 import uuid
 from message import Message
-from managers import MessageManager, ConnectionManager
-from handlers import Handler, MessageHandler, ConnectionRequestHandler, CommandHandler, EventHandler, MessageEventHandler, CommandEventHandler, GeneralHandler, HandlerFactory
+from managers import MessageManager, ConnectionManager, ConnectionRequest
+from handlers import Handler, MessageHandler, CommandHandler, EventHandler, MessageEventHandler, CommandEventHandler, GeneralHandler, HandlerFactory, DispatchTable
 from errors import InvalidDestinationError, UnconnectedDestinationError, UnhandledTypeError, ConnectionError, PortError
 from typing import Optional
-from utils import thread_safe_method, setup_logger, update_config, hash, verify_hash, get_config
-
-class ConnectionRequest:
-    def __init__(self, source_port, token):
-        self.source_port = source_port
-        self.token = token # The token is now a string
-
-    def __str__(self):
-        return f"ConnectionRequest(source_port={self.source_port}, token={self.token})"
+from utils import thread_safe_method, setup_logger, update_config, hash, verify_hash
 
 class Port:
+    _DEFAULT_PASSWORD = 'password'
+
     _REQUIRED_CONFIG_KEYS = ['id', 'address', 'logger', 'lock', 'handlers']
 
     _DEFAULT_CONFIG = {
@@ -25,20 +19,21 @@ class Port:
         'address': lambda: str(uuid.uuid4()),
         'lock': lambda: threading.Lock(),
         '_owner': lambda: None,
-        '_hashed_password': lambda: hash('password'),
+        '_hashed_password': None, # Derived on first use, see _get_hashed_password
         '_restricted_config_keys': lambda: {'id', 'address', 'lock'},
         '_logger_level': 'DEBUG',
+        'is_trusted': False,
         'is_connected': lambda: False,
         'is_open': lambda: False,
         'is_locked': lambda: False,
         'is_running': lambda: False,
     }
 
-    def __init__(self, config=None):
+    def __init__(self, config=None, handlers=None):
         self._initialize_default_config()
         self._connection_manager = ConnectionManager(self)
         self._message_manager = MessageManager(self)
-        self._initialize_handlers()
+        self._initialize_handlers(handlers)
         self.setup_logger()
 
         if config:
@@ -49,14 +44,32 @@ class Port:
     def _initialize_default_config(self):
      utils.run_default_config(self, self._DEFAULT_CONFIG)
      utils.verify_config(self, self._REQUIRED_CONFIG_KEYS)
-     # Hash the default password
-     self._hashed_password = bcrypt.hashpw('password'.encode(), bcrypt.gensalt())
+
+    def _get_hashed_password(self):
+        # Hashing with bcrypt costs far more than building the rest of the Port,
+        # so the default credentials are only derived for the first authenticated connection
+        if self._hashed_password is None:
+            self._hashed_password = hash(self._DEFAULT_PASSWORD)
+        return self._hashed_password
 
     def _verify_password(self, password):
-        return bcrypt.checkpw(password.encode(), self._hashed_password)
+        if password is None:
+            return False
+        return verify_hash(password, self._get_hashed_password())
+
+    def _initialize_handlers(self, handlers=None):
+        # Handlers keep no per-port state, so ports share one compiled dispatch table.
+        # Handlers given to a single port are layered over the defaults, not copied into them
+        if handlers is None:
+            self._handlers = DispatchTable.default()
+        elif isinstance(handlers, DispatchTable):
+            self._handlers = handlers
+        else:
+            self._handlers = DispatchTable.default().with_handlers(handlers)
 
-    def _initialize_handlers(self):
-        self._handlers = HandlerFactory.create_handlers()
+    def override_handlers(self, handlers):
+        # Copy-on-write: only this port's reference changes, the shared table is untouched
+        self._handlers = self._handlers.with_handlers(handlers)
 
     def setup_logger(self):
         self.logger = utils.setup_logger(self, self._logger_level)
@@ -64,7 +77,7 @@ class Port:
 
     def _change_password(self, old_password, new_password):
         # Verify the old password
-        if bcrypt.checkpw(old_password.encode(), self._hashed_password):
+        if self._verify_password(old_password):
             # Check strength of the new password
             if len(new_password) < 8 or not any(char.isdigit() for char in new_password):
                 raise ValueError("New password is not strong enough.")
@@ -88,18 +101,21 @@ class Port:
             return
 
         try:
-            for handler in self._handlers:
-                if handler.can_handle(data['type']):
-                    handler.handle(data)
-                    break
-            else:
+            handler = self._handlers.resolve(data['type'])
+            if handler is None:
                 raise UnhandledTypeError(f"Port {self.address} received unknown type: {data['type']}")
+            handler.handle(data)
         except Exception as e:
             self.logger.error(f"Error while handling data: {str(e)}")
 
-    def connect(self, target):
+    def connect(self, target, password=None):
         with self.lock:  # Acquire the lock
-            self._connection_manager.connect(target)
+            self._connection_manager.connect(target, password)
+
+    def connect_many(self, targets, password=None):
+        # One lock acquisition and one registration for a whole batch of targets
+        with self.lock:
+            return self._connection_manager.connect_many(targets, password)
 
     def disconnect(self, target):
         with self.lock:  # Acquire the lock
@@ -108,11 +124,11 @@ class Port:
     def handle_connection_request(self, request):
         if not isinstance(request, ConnectionRequest):
             return False
-        # The hashed token should be stored somewhere safe when the connection request was created
-        # Here we assume that it's stored in self._hashed_token
-        if bcrypt.checkpw(request.token.encode(), self._hashed_token):
+        # Fast path: two trusted Ports in the same process skip the credential check
+        if request.trusted and self.is_trusted and isinstance(request.source_port, Port):
             return True
-        return False
+        # Otherwise the request token has to match this Port's password
+        return self._verify_password(request.token)
 
     def send(self, content, destinations):
         self._message_manager.send(content, destinations)
@@ -133,9 +149,9 @@ class Port:
     def unlock(self):
         self.is_locked = False
 
-def connect_ports(port1, port2):
-    port1.connect(port2)
-    port2.connect(port1)
+def connect_ports(port1, port2, password=None):
+    port1.connect(port2, password)
+    port2.connect(port1, password)
 
 def disconnect_ports(port1, port2):
     port1.disconnect(port2)
@@ -147,9 +163,25 @@ def main():
     p2 = Port()
     p3 = Port()
 
+    # Untrusted ports only connect with the right password, hashed on first use
+    try:
+        p1.connect(p2, 'wrong password')
+    except ConnectionError:
+        pass
+    else:
+        print("Test failed: connected with the wrong password.")
+    assert p2 not in p1.get_connections(), "A refused connection should not be registered."
+
     # Connect the ports
-    connect_ports(p1, p2)
-    connect_ports(p1, p3)
+    connect_ports(p1, p2, Port._DEFAULT_PASSWORD)
+    connect_ports(p1, p3, Port._DEFAULT_PASSWORD)
+    assert p2 in p1.get_connections() and p1 in p2.get_connections(), "Password-protected connect failed."
+
+    # Trusted ports in the same process connect without a password or a bcrypt hash
+    t1 = Port({'is_trusted': True})
+    t2 = Port({'is_trusted': True})
+    connect_ports(t1, t2)
+    assert t1._hashed_password is None and t2._hashed_password is None, "Trusted connects should skip hashing."
 
     # Send data from p1 to p2
     p1.send("Hello World!", p2)
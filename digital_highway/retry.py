@@ -0,0 +1,151 @@
+import math
+import time
+import random
+import asyncio
+from collections import deque
+from utils import setup_logger, generate_unique_id
+
+class RetryPolicy:
+    """
+    Jittered exponential backoff.
+
+    The nth retry waits a random time between 0 and
+    min(max_delay, base_delay * multiplier ** (n - 1)) seconds ("full
+    jitter"), so handlers that fail together don't retry in lockstep.
+    max_attempts counts the first try, so 1 means never retry.
+    """
+    def __init__(self, max_attempts=3, base_delay=0.1, max_delay=10.0, multiplier=2.0, jitter=True):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+
+    def delay(self, attempt):
+        # attempt is the number of tries made so far
+        ceiling = min(self.max_delay, self.base_delay * self.multiplier ** (attempt - 1))
+        return random.uniform(0, ceiling) if self.jitter else ceiling
+
+    def should_retry(self, attempt):
+        return attempt < self.max_attempts
+
+NO_RETRY = RetryPolicy(max_attempts=1)
+
+class TimerWheel:
+    """
+    Hashed timing wheel for scheduling many callbacks on the event loop.
+
+    Timers land in one of `slots` buckets, `tick` seconds apart. A single
+    task advances one bucket per tick and runs whatever is due, so
+    scheduling is O(1) and thousands of pending retries cost one task
+    rather than one sleeping coroutine each. The task only runs while
+    timers are pending. Timers fire up to one tick late.
+    """
+    def __init__(self, tick=0.01, slots=512):
+        self.id = generate_unique_id()
+        self.tick = tick
+        self.slots = slots
+        self.logger = setup_logger(self)
+        self._wheel = None  # Built with the first timer, since most queues never schedule one
+        self._position = 0
+        self._count = 0
+        self._task = None
+
+    def __len__(self):
+        return self._count
+
+    def schedule(self, delay, callback):
+        ticks = max(1, math.ceil(delay / self.tick))
+        if self._wheel is None:
+            self._wheel = [[] for _ in range(self.slots)]
+        timer = [(ticks - 1) // self.slots, callback]  # Full turns to wait, callback
+        self._wheel[(self._position + ticks) % self.slots].append(timer)
+        self._count += 1
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return timer
+
+    def cancel(self, timer):
+        if timer[1] is not None:
+            timer[1] = None
+            self._count -= 1
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while self._count:
+            next_tick += self.tick
+            await asyncio.sleep(max(0.0, next_tick - loop.time()))
+            self._position = (self._position + 1) % self.slots
+            due = []
+            waiting = []
+            for timer in self._wheel[self._position]:
+                if timer[1] is None:
+                    continue  # Cancelled
+                if timer[0] == 0:
+                    due.append(timer[1])
+                else:
+                    timer[0] -= 1
+                    waiting.append(timer)
+            self._wheel[self._position] = waiting
+            self._count -= len(due)
+            for callback in due:
+                try:
+                    callback()
+                except Exception as e:
+                    self.logger.error(f"Error in timer callback: {str(e)}", exc_info=True)
+
+    def stop(self):
+        # Drops every pending timer
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._wheel = None
+        self._count = 0
+
+class DeadLetter:
+    __slots__ = ('event', 'handler', 'attempts', 'error', 'failed_at')
+
+    def __init__(self, event, handler, attempts, error):
+        self.event = event
+        self.handler = handler
+        self.attempts = attempts
+        self.error = error
+        self.failed_at = time.time()
+
+    def __repr__(self):
+        return f'DeadLetter(event={getattr(self.event, "id", self.event)}, handler={type(self.handler).__name__}, attempts={self.attempts}, error={self.error})'
+
+class DeadLetterQueue:
+    """
+    Events whose handler kept failing after all its retries.
+
+    Each DeadLetter records the event, the handler that gave up, how many
+    attempts were made and the final error. Once maxlen is reached, the
+    oldest letters are discarded. Letters can be inspected by iterating, and
+    take() removes the ones matching a predicate, e.g. to replay them.
+    """
+    def __init__(self, maxlen=10_000):
+        self._letters = deque(maxlen=maxlen)
+
+    def add(self, letter):
+        self._letters.append(letter)
+
+    def take(self, predicate=None):
+        taken = [letter for letter in self._letters if predicate is None or predicate(letter)]
+        if taken:
+            taken_ids = set(map(id, taken))
+            self._letters = deque((letter for letter in self._letters if id(letter) not in taken_ids), maxlen=self._letters.maxlen)
+        return taken
+
+    def clear(self):
+        self._letters.clear()
+
+    def __iter__(self):
+        return iter(list(self._letters))
+
+    def __len__(self):
+        return len(self._letters)
+
+    def __repr__(self):
+        return f'DeadLetterQueue(letters={len(self)})'
@@ -1,6 +1,7 @@
 from abc import ABC, abstractmethod
+from collections import defaultdict
+from itertools import count
 from typing import Any
-from bot import Bot
 
 class Search(ABC):
     @abstractmethod
@@ -15,16 +16,281 @@ class ContainsSearch(Search):
     def search(self, target, term):
         return [obj for obj in target if any(term in str(getattr(obj, attr, '')) for attr in vars(obj))]
 
+class Query(ABC):
+    """
+    A condition evaluated against a SearchIndex. Combine queries with
+    & (and), | (or) and ~ (not): Equals('type', 'Bot') & Contains('name', 'Ada')
+    """
+    @abstractmethod
+    def evaluate(self, index):
+        # Returns the set of index keys that match
+        pass
+
+    def __and__(self, other):
+        return And(self, other)
+
+    def __or__(self, other):
+        return Or(self, other)
+
+    def __invert__(self):
+        return Not(self)
+
+class Equals(Query):
+    # attribute=None matches the value in any attribute
+    def __init__(self, attribute, value):
+        self.attribute = attribute
+        self.value = value
+
+    def evaluate(self, index):
+        return index.equal_keys(self.attribute, self.value)
+
+class Contains(Query):
+    # attribute=None matches the term in any attribute
+    def __init__(self, attribute, term):
+        self.attribute = attribute
+        self.term = term
+
+    def evaluate(self, index):
+        return index.contains_keys(self.attribute, self.term)
+
+class And(Query):
+    def __init__(self, *queries):
+        self.queries = queries
+
+    def evaluate(self, index):
+        keys = None
+        for query in self.queries:
+            keys = query.evaluate(index) if keys is None else keys & query.evaluate(index)
+            if not keys:
+                break
+        return keys or set()
+
+class Or(Query):
+    def __init__(self, *queries):
+        self.queries = queries
+
+    def evaluate(self, index):
+        return set().union(*(query.evaluate(index) for query in self.queries))
+
+class Not(Query):
+    def __init__(self, query):
+        self.query = query
+
+    def evaluate(self, index):
+        return index.keys() - self.query.evaluate(index)
+
+class SearchIndex:
+    """
+    Incrementally maintained index over the attributes of a set of objects.
+
+    Equality lookups go through an attribute -> value -> keys map. Contains
+    lookups go through an index of every substring up to ngram characters
+    long of each attribute's str(). Short terms are answered from the
+    postings directly. Longer terms intersect the postings of their n-grams
+    and check the few remaining candidates. Objects are re-indexed when
+    update() is called, which Searchable objects do on every setattr.
+    """
+    def __init__(self, attributes=None, ngram=3, max_text_length=256):
+        self.attributes = attributes  # None indexes every attribute, like vars(obj)
+        self.ngram = ngram
+        self.max_text_length = max_text_length
+        self._objects = {}  # key -> object
+        self._order = {}  # key -> insertion sequence, so results come back in insertion order
+        self._sequence = count()
+        self._values = defaultdict(dict)  # key -> attribute -> indexed value
+        self._texts = {}  # (attribute, key) -> str(value)
+        self._equal = defaultdict(lambda: defaultdict(set))  # attribute -> value -> keys
+        self._unhashable = defaultdict(dict)  # attribute -> key -> value that can't be a dict key
+        self._grams = defaultdict(set)  # substring -> (attribute, key) pairs
+        self._long_texts = set()  # (attribute, key) pairs too long to n-gram, scanned instead
+
+    def __len__(self):
+        return len(self._objects)
+
+    def __contains__(self, obj):
+        return id(obj) in self._objects
+
+    def keys(self):
+        return self._objects.keys()
+
+    def _attributes_of(self, obj):
+        if self.attributes is not None:
+            return [attribute for attribute in self.attributes if hasattr(obj, attribute)]
+        names = vars(obj) if hasattr(obj, '__dict__') else getattr(type(obj), '__slots__', ())
+        return [name for name in names if name != '_search_indexes']
+
+    def add(self, obj):
+        key = id(obj)
+        if key in self._objects:
+            return
+        self._objects[key] = obj
+        self._order[key] = next(self._sequence)
+        for attribute in self._attributes_of(obj):
+            self._index(key, attribute, getattr(obj, attribute))
+        if isinstance(obj, Searchable):
+            obj.__dict__.setdefault('_search_indexes', []).append(self)
+
+    def add_many(self, objects):
+        for obj in objects:
+            self.add(obj)
+
+    def remove(self, obj):
+        key = id(obj)
+        if self._objects.pop(key, None) is None:
+            return
+        del self._order[key]
+        for attribute in list(self._values.get(key, ())):
+            self._unindex(key, attribute)
+        self._values.pop(key, None)
+        if isinstance(obj, Searchable):
+            obj.__dict__['_search_indexes'].remove(self)
+
+    def update(self, obj, attribute=None):
+        """Re-indexes one attribute of obj, or all of them."""
+        key = id(obj)
+        if key not in self._objects:
+            return
+        if attribute is None:
+            for attribute in list(self._values.get(key, ())):
+                self._unindex(key, attribute)
+            for attribute in self._attributes_of(obj):
+                self._index(key, attribute, getattr(obj, attribute))
+        elif self.attributes is None or attribute in self.attributes:
+            if attribute == '_search_indexes':
+                return
+            self._unindex(key, attribute)
+            if hasattr(obj, attribute):
+                self._index(key, attribute, getattr(obj, attribute))
+
+    def _index(self, key, attribute, value):
+        self._values[key][attribute] = value
+        try:
+            self._equal[attribute][value].add(key)
+        except TypeError:
+            self._unhashable[attribute][key] = value
+
+        text = str(value)
+        self._texts[(attribute, key)] = text
+        if len(text) > self.max_text_length:
+            self._long_texts.add((attribute, key))
+            return
+        for gram in self._substrings(text):
+            self._grams[gram].add((attribute, key))
+
+    def _unindex(self, key, attribute):
+        values = self._values.get(key)
+        if not values or attribute not in values:
+            return
+        value = values.pop(attribute)
+        if self._unhashable[attribute].pop(key, None) is None:
+            keys = self._equal[attribute][value]
+            keys.discard(key)
+            if not keys:
+                del self._equal[attribute][value]
+
+        text = self._texts.pop((attribute, key))
+        if (attribute, key) in self._long_texts:
+            self._long_texts.discard((attribute, key))
+            return
+        for gram in self._substrings(text):
+            pairs = self._grams[gram]
+            pairs.discard((attribute, key))
+            if not pairs:
+                del self._grams[gram]
+
+    def _substrings(self, text):
+        grams = set()
+        for size in range(1, self.ngram + 1):
+            grams.update(text[i:i + size] for i in range(len(text) - size + 1))
+        return grams
+
+    def equal_keys(self, attribute, value):
+        attributes = [attribute] if attribute is not None else list(self._equal.keys() | self._unhashable.keys())
+        keys = set()
+        for name in attributes:
+            try:
+                keys |= self._equal[name].get(value, set())
+            except TypeError:
+                pass  # An unhashable term can only equal an unhashable value
+            keys.update(key for key, stored in self._unhashable[name].items() if stored == value)
+        return keys
+
+    def contains_keys(self, attribute, term):
+        term = str(term)
+        if not term:
+            return set(self._objects) if attribute is None else {key for name, key in self._texts if name == attribute}
+        if len(term) <= self.ngram:
+            pairs = self._grams.get(term, set())
+        else:
+            postings = sorted((self._grams.get(term[i:i + self.ngram], set()) for i in range(len(term) - self.ngram + 1)), key=len)
+            pairs = {pair for pair in set.intersection(*postings) if term in self._texts[pair]}
+        pairs = pairs | {pair for pair in self._long_texts if term in self._texts[pair]}
+        return {key for name, key in pairs if attribute is None or name == attribute}
+
+    def search(self, query):
+        keys = query.evaluate(self)
+        return [self._objects[key] for key in sorted(keys, key=self._order.__getitem__)]
+
+class Searchable:
+    """
+    Mixin that keeps every SearchIndex an object has been added to current
+    as its attributes are set.
+    """
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        for index in self.__dict__.get('_search_indexes', ()):
+            index.update(self, name)
+
 class SearchManager:
     def __init__(self):
+        from bot import Bot  # bot.py imports Searchable from here
         self.strategies = {
             str: ContainsSearch(),
             Bot: EqualitySearch(),
         }
+        self.indexes = {}
+
+    def register_index(self, name, objects=(), attributes=None):
+        index = SearchIndex(attributes)
+        index.add_many(objects)
+        self.indexes[name] = index
+        return index
+
+    def unregister_index(self, name):
+        index = self.indexes.pop(name)
+        for obj in list(index._objects.values()):
+            index.remove(obj)
 
     def search(self, target, term):
+        # target is a registered index name, a SearchIndex, or any iterable to scan
+        index = self.indexes.get(target) if isinstance(target, str) else target
+        if isinstance(index, SearchIndex):
+            if not isinstance(term, Query):
+                term = Contains(None, term) if isinstance(term, str) else Equals(None, term)
+            return index.search(term)
+
         strategy = self.strategies.get(type(term))
         if strategy:
             return strategy.search(target, term)
         else:
             raise ValueError(f"No search strategy found for type: {type(term)}")
+
+if __name__ == '__main__':
+    class Record(Searchable):
+        def __init__(self, name, kind):
+            self.name = name
+            self.kind = kind
+
+    ada, alan, basil = Record('Ada Abbott', 'bot'), Record('Alan Archer', 'hub'), Record('Basil Baker', 'bot')
+    index = SearchIndex()
+    index.add_many([ada, alan, basil])
+    assert index.search(Contains('name', 'A')) == [ada, alan]
+    assert index.search(Contains(None, 'Archer')) == [alan]
+    assert index.search(Equals('kind', 'bot') & ~Contains('name', 'Ada')) == [basil]
+    assert index.search(Equals('kind', 'hub') | Contains('name', 'Bak')) == [alan, basil]
+
+    # Searchable objects re-index themselves when they change
+    basil.kind = 'hub'
+    assert index.search(Equals('kind', 'hub')) == [alan, basil]
+    index.remove(alan)
+    assert index.search(Equals('kind', 'hub')) == [basil]
@@ -0,0 +1,125 @@
+import re
+import zlib
+import numpy as np
+
+_TOKEN_PATTERN = re.compile(r'\w+')
+
+class HashingEmbedder:
+    """
+    Offline text embedder using the hashing trick.
+
+    Tokens are hashed into a fixed number of signed buckets, so there's no
+    vocabulary to fit or store and new text never needs a rebuild. Term
+    counts are log-scaled; the IDF part of TF-IDF is applied by the
+    VectorIndex, which knows the document frequencies.
+    """
+    def __init__(self, num_features=1024, ngram_range=(1, 2)):
+        self.num_features = num_features
+        self.ngram_range = ngram_range
+
+    def tokens(self, text):
+        words = _TOKEN_PATTERN.findall(str(text).lower())
+        low, high = self.ngram_range
+        for n in range(low, high + 1):
+            for i in range(len(words) - n + 1):
+                yield ' '.join(words[i:i + n])
+
+    def embed(self, text):
+        vector = np.zeros(self.num_features, dtype=np.float32)
+        for token in self.tokens(text):
+            # crc32 rather than hash() so embeddings are stable across processes
+            bucket = zlib.crc32(token.encode())
+            vector[bucket % self.num_features] += 1.0 if bucket & 0x80000000 else -1.0
+        return np.sign(vector) * np.log1p(np.abs(vector))
+
+    def embed_batch(self, texts):
+        matrix = np.zeros((len(texts), self.num_features), dtype=np.float32)
+        for row, text in enumerate(texts):
+            matrix[row] = self.embed(text)
+        return matrix
+
+class VectorIndex:
+    """
+    Growable embedding matrix for top-k cosine similarity search.
+
+    Rows are appended incrementally into preallocated space that doubles
+    when full. Searches score every stored row against a batch of queries
+    in one matrix product, weighting buckets by their inverse document
+    frequency at query time so the weights stay current as items arrive.
+    """
+    def __init__(self, embedder=None, capacity=1024):
+        self.embedder = embedder or HashingEmbedder()
+        self._matrix = np.zeros((capacity, self.embedder.num_features), dtype=np.float32)
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._document_frequency = np.zeros(self.embedder.num_features, dtype=np.int64)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def _reserve(self, count):
+        needed = self._size + count
+        if needed <= len(self._ids):
+            return
+        capacity = max(needed, 2 * len(self._ids))
+        matrix = np.zeros((capacity, self._matrix.shape[1]), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        ids = np.zeros(capacity, dtype=np.int64)
+        ids[:self._size] = self._ids[:self._size]
+        self._matrix, self._ids = matrix, ids
+
+    def add(self, item_id, text):
+        self.add_many([item_id], [text])
+
+    def add_many(self, item_ids, texts):
+        vectors = self.embedder.embed_batch(texts)
+        self._reserve(len(vectors))
+        rows = slice(self._size, self._size + len(vectors))
+        self._matrix[rows] = vectors
+        self._ids[rows] = item_ids
+        self._document_frequency += np.count_nonzero(vectors, axis=0)
+        self._size += len(vectors)
+
+    def clear(self):
+        self._document_frequency[:] = 0
+        self._size = 0
+
+    def _idf_squared(self):
+        idf = np.log((1 + self._size) / (1 + self._document_frequency)) + 1.0
+        return (idf * idf).astype(np.float32)
+
+    def search(self, query, k=5):
+        return self.search_batch([query], k)[0]
+
+    def search_batch(self, queries, k=5):
+        """
+        Returns, for each query, up to k (item id, score) pairs with the most
+        similar first. Items that share no tokens with a query are left out.
+        """
+        if not self._size or not queries:
+            return [[] for _ in queries]
+        matrix = self._matrix[:self._size]
+        weights = self._idf_squared()
+        query_vectors = self.embedder.embed_batch(queries)
+
+        # cos(d * idf, q * idf) = d . (q * idf^2) / (|d * idf| |q * idf|)
+        row_norms = np.sqrt((matrix * matrix) @ weights)
+        query_norms = np.sqrt((query_vectors * query_vectors) @ weights)
+        scores = ((query_vectors * weights) @ matrix.T) / np.maximum(np.outer(query_norms, row_norms), 1e-12)
+
+        k = min(k, self._size)
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for query_scores, candidates in zip(scores, top):
+            ranked = candidates[np.argsort(-query_scores[candidates])]
+            results.append([(int(self._ids[row]), float(query_scores[row])) for row in ranked if query_scores[row] > 0])
+        return results
+
+if __name__ == '__main__':
+    index = VectorIndex()
+    index.add_many([1, 2, 3], ['the cat sat on the mat', 'dogs chase cats', 'stock prices fell sharply'])
+    index.add(4, 'a cat on a mat')
+    assert [item_id for item_id, _ in index.search('cat on the mat', k=2)] == [1, 4]
+    assert index.search('stock market')[0][0] == 3
+    assert index.search('zebra') == []
+    print(index.search_batch(['cat mat', 'prices'], k=2))
@@ -1,4 +1,5 @@
 import uuid
+import logging
 import utils
 
 class State:
@@ -80,7 +81,7 @@ class State:
             elif attr == 'port':  # For port and state, we want to use their IDs
                 value = value.id
             elif attr == 'logger':  # For logger, we want to display its level
-                value = value.level
+                value = logging.getLevelName(value.getEffectiveLevel())
             elif attr == 'lock':  # For lock, we want to display its state
                 value = 'locked' if value.locked() else 'unlocked'
             lines.append(f'{attr}: {value}')
@@ -1,10 +1,15 @@
 import os
+import sys
+import queue
+import atexit
 import logging
+import logging.handlers
+import threading
 from uuid import uuid4
-import sys
 from dotenv import load_dotenv
 from functools import wraps
-import requests
+import bcrypt
+import names
 
 load_dotenv()
 
@@ -26,69 +31,122 @@ def thread_safe_method(method):
             return method(self, *args, **kwargs)
     return _method
 
+LOG_DIR = 'logs'
+MAX_LOG_FILES = int(os.getenv('MAX_LOG_FILES', 8))
+LOG_FORMAT = '%(asctime)s : %(levelname)s : %(component)s %(instance_id)s : %(message)s'
+
+class _ComponentContext(logging.Filter):
+    # Records that didn't come through setup_logger still need the structured fields
+    def filter(self, record):
+        if not hasattr(record, 'component'):
+            record.component = record.name
+        if not hasattr(record, 'instance_id'):
+            record.instance_id = '-'
+        return True
+
+class _ComponentFileRouter(logging.Handler):
+    """
+    Writes each component's records to logs/<component>.log.
+
+    At most max_files component files are ever open. Components beyond the
+    cap share the main log file, so the number of open handles stays fixed
+    however many objects are created.
+    """
+    def __init__(self, log_dir, main_handler, max_files):
+        super().__init__()
+        self.log_dir = log_dir
+        self.main_handler = main_handler
+        self.max_files = max_files
+        self.files = {}
+
+    def emit(self, record):
+        handler = self.files.get(record.component)
+        if handler is None:
+            if len(self.files) >= self.max_files:
+                handler = self.main_handler
+            else:
+                handler = logging.FileHandler(os.path.join(self.log_dir, f'{record.component}.log'))
+                handler.setFormatter(self.formatter)
+                self.files[record.component] = handler
+        handler.handle(record)
+
+    def close(self):
+        for handler in self.files.values():
+            handler.close()
+        self.main_handler.close()
+        super().close()
+
+class LoggingSubsystem:
+    """
+    Process-wide logging for the digital_highway package.
+
+    Every component logger hangs off one 'digital_highway' logger whose only
+    handler puts records on a queue. A single listener thread drains the
+    queue into stdout and the capped set of log files, so logging never
+    blocks on disk and no object gets handlers of its own.
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, log_dir=LOG_DIR, max_files=MAX_LOG_FILES):
+        os.makedirs(log_dir, exist_ok=True)
+        self.formatter = logging.Formatter(LOG_FORMAT)
+        self.queue = queue.SimpleQueue()
+
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(self.formatter)
+        main_handler = logging.FileHandler(os.path.join(log_dir, 'digital_highway.log'))
+        main_handler.setFormatter(self.formatter)
+        self.file_router = _ComponentFileRouter(log_dir, main_handler, max_files)
+        self.file_router.setFormatter(self.formatter)
+
+        queue_handler = logging.handlers.QueueHandler(self.queue)
+        queue_handler.addFilter(_ComponentContext())
+        self.logger = logging.getLogger('digital_highway')
+        self.logger.propagate = False
+        self.logger.addHandler(queue_handler)
+
+        self.listener = logging.handlers.QueueListener(self.queue, stream_handler, self.file_router)
+        self.listener.start()
+        atexit.register(self.shutdown)
+
+    @classmethod
+    def get(cls):
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
+
+    def get_logger(self, component):
+        return logging.getLogger(f'digital_highway.{component}')
+
+    def shutdown(self):
+        # Flushes whatever is still queued
+        self.listener.stop()
+        self.file_router.close()
+
 def setup_logger(target, level=None):
-    # Create logs directory if not exists
-    if not os.path.exists('logs'):
-        os.makedirs('logs')
-
-    # Create subdirectory for class name if not exists
-    if not os.path.exists(f'logs/{target.__class__.__name__}'):
-        os.makedirs(f'logs/{target.__class__.__name__}')
-
-    # Create subdirectory for ID if not exists
-    if not os.path.exists(f'logs/{target.__class__.__name__}/{target.id}'):
-        os.makedirs(f'logs/{target.__class__.__name__}/{target.id}')
-
-    # Use SingletonLogger to get/create a logger
-    singleton_logger = SingletonLogger(target.__class__.__name__)
-    logger = singleton_logger.get_logger()
-
-    # Set level
-    if level:
-        singleton_logger.set_level(level)
-    else:
-        singleton_logger.set_level('INFO')
-
-    level_dict = {
-        'DEBUG': logging.DEBUG,
-        'INFO': logging.INFO,
-        'WARNING': logging.WARNING,
-        'ERROR': logging.ERROR,
-        'CRITICAL': logging.CRITICAL
-    }
-
-    if level in level_dict:
-        logger.setLevel(level_dict[level])
-    else:
-        logger.setLevel(logging.INFO)  # Default level
-
-    # Add the handlers to the logger
-    c_handler = logging.StreamHandler()
-    f_handler = logging.FileHandler(f'logs/{target.__class__.__name__}/{target.id}/{target.id}.log')
-    formatter = logging.Formatter('%(asctime)s : %(levelname)s : %(message)s')
-    c_handler.setFormatter(formatter)
-    f_handler.setFormatter(formatter)
-    logger.addHandler(c_handler)
-    logger.addHandler(f_handler)
-
-    return logger
+    # Loggers are shared per class; the instance only adds its id as context
+    component = target.__class__.__name__
+    logger = LoggingSubsystem.get().get_logger(component)
 
-class SingletonLogger:
-    _loggers = {}
+    log_level = getattr(logging, level.upper(), None) if level else logging.INFO
+    if not isinstance(log_level, int):
+        log_level = logging.INFO  # Default level
+    if logger.level != log_level:
+        logger.setLevel(log_level)
+
+    return logging.LoggerAdapter(logger, {'component': component, 'instance_id': getattr(target, 'id', '-')})
 
+class SingletonLogger:
+    # Kept for callers that want a class-level logger without an instance
     def __init__(self, classname):
         self.logger = self.create_logger(classname)
 
     @classmethod
     def create_logger(cls, classname):
-        if classname not in cls._loggers:
-            new_logger = logging.getLogger(f"BotLogger-{classname}")
-            handler = logging.StreamHandler(sys.stdout)
-            formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-            handler.setFormatter(formatter)
-            new_logger.addHandler(handler)
-            cls._loggers[classname] = new_logger
-        return cls._loggers[classname]
+        return LoggingSubsystem.get().get_logger(classname)
 
     def set_level(self, level):
         log_level = getattr(logging, level.upper(), None)
@@ -102,6 +160,13 @@ class SingletonLogger:
 def generate_unique_id():
     return str(uuid4())
 
+def hash(value):
+    # bcrypt is deliberately slow (tens of ms per call), so only call this when a credential is actually needed
+    return bcrypt.hashpw(value.encode(), bcrypt.gensalt())
+
+def verify_hash(value, hashed):
+    return bcrypt.checkpw(value.encode(), hashed)
+
 def run_default_config(target, config):
     for key, value in config.items():
         if callable(value):
@@ -139,16 +204,5 @@ def verify_config(target, config):
 
 
 def generate_name():
-    try:
-        response = requests.get('https://uinames.com/api/?ext', timeout=5)
-        response.raise_for_status()  # this line will raise an HTTPError if the response was unsuccessful
-        data = response.json()
-        return data['name'] + ' ' + data['surname']
-
-    except requests.exceptions.RequestException as e:
-        print(f"Request to uinames API failed: {e}")
-        return "Winfo"
-
-    except Exception as e:
-        print(f"An error occurred: {e}")
-        return "Winfo"
\ No newline at end of file
+    # Names come from bundled word lists; bot construction never touches the network
+    return names.generate_name()
@@ -0,0 +1,234 @@
+import os
+import zlib
+import pickle
+import struct
+import asyncio
+from utils import setup_logger, generate_unique_id
+
+# Record kinds
+APPEND = 1
+ACK = 2
+
+_HEADER = struct.Struct('<BIqI')  # kind, payload length, sequence number, crc32 of the payload
+_SEGMENT_PREFIX = 'wal-'
+_SEGMENT_SUFFIX = '.log'
+_CHECKPOINT = 'checkpoint'
+
+class WriteAheadLog:
+    """
+    Segmented, group-committed write-ahead log of records with acknowledgements.
+
+    append() gives each record a sequence number and buffers it. The buffer
+    is written out as one group, in a worker thread so the event loop never
+    blocks on disk. A group goes out once commit_interval seconds have passed
+    or the buffer reaches max_group_bytes, and is fsynced if fsync=True. The
+    future append() returns resolves when the record's group is on disk.
+    sync_commit tells callers whether they should wait for it. The knobs
+    trade throughput for durability:
+
+        fsync=True, sync_commit=True    survives power loss once append completes
+        fsync=True, sync_commit=False   loses at most the last group on power loss
+        fsync=False                     survives process crashes, not power loss
+
+    ack() marks a record done. checkpoint() stores the lowest sequence number
+    still unacknowledged and deletes the segments wholly below it. It runs
+    every checkpoint_every acks and on close(). replay() returns the
+    unacknowledged records left by the last run. A torn record at the end
+    of a segment is truncated away.
+    """
+    def __init__(self, directory, segment_size=16 * 2**20, commit_interval=0.002, max_group_bytes=2**20,
+                 fsync=True, sync_commit=True, checkpoint_every=10_000):
+        self.id = generate_unique_id()
+        self.directory = directory
+        self.segment_size = segment_size
+        self.commit_interval = commit_interval
+        self.max_group_bytes = max_group_bytes
+        self.fsync = fsync
+        self.sync_commit = sync_commit
+        self.checkpoint_every = checkpoint_every
+        self.logger = setup_logger(self)
+        os.makedirs(directory, exist_ok=True)
+
+        self._next_sequence = 0
+        self._unacked = set()
+        self._acks_since_checkpoint = 0
+        self._buffer = []
+        self._buffered_bytes = 0
+        self._waiters = []
+        self._flush_handle = None
+        self._flush_task = None
+        self._segment = None
+        self._segment_bytes = 0
+        self._recovered = self._recover()
+
+    def _segments(self):
+        # (first sequence number, path), oldest first
+        segments = []
+        for name in os.listdir(self.directory):
+            if name.startswith(_SEGMENT_PREFIX) and name.endswith(_SEGMENT_SUFFIX):
+                first = name[len(_SEGMENT_PREFIX):-len(_SEGMENT_SUFFIX)].split('-')[0]
+                segments.append((int(first), os.path.join(self.directory, name)))
+        return sorted(segments)
+
+    def _read_checkpoint(self):
+        try:
+            with open(os.path.join(self.directory, _CHECKPOINT)) as checkpoint_file:
+                return int(checkpoint_file.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def _recover(self):
+        low_water = self._read_checkpoint()
+        self._next_sequence = low_water
+        segments = self._segments()
+        pending = {}  # sequence number -> (segment data, payload offset, length)
+        for index, (first, path) in enumerate(segments):
+            if index + 1 < len(segments) and segments[index + 1][0] <= low_water:
+                continue  # Wholly below the checkpoint
+            with open(path, 'rb') as segment_file:
+                data = segment_file.read()
+            view = memoryview(data)
+            offset = 0
+            while offset < len(data):
+                if offset + _HEADER.size > len(data):
+                    break
+                kind, length, sequence, crc = _HEADER.unpack_from(data, offset)
+                start = offset + _HEADER.size
+                if start + length > len(data) or zlib.crc32(view[start:start + length]) != crc:
+                    break
+                if kind == APPEND and sequence >= low_water:
+                    pending[sequence] = (data, start, length)
+                elif kind == ACK:
+                    pending.pop(sequence, None)
+                self._next_sequence = max(self._next_sequence, sequence + 1)
+                offset = start + length
+            if offset < len(data):
+                self.logger.warning(f"Truncating torn WAL record at byte {offset} of {path}")
+                with open(path, 'r+b') as segment_file:
+                    segment_file.truncate(offset)
+
+        # Only the records that survived are unpickled
+        records = [(sequence, pickle.loads(memoryview(data)[start:start + length])) for sequence, (data, start, length) in sorted(pending.items())]
+        self._unacked = set(pending)
+        if records:
+            self.logger.info(f"Recovered {len(records)} unacknowledged WAL records")
+        return records
+
+    def replay(self):
+        """Returns the (sequence number, record) pairs left unacknowledged by the last run, once."""
+        records, self._recovered = self._recovered, []
+        return records
+
+    def append(self, record):
+        """Buffers a record. Returns its sequence number and a future that resolves once it's on disk."""
+        sequence = self._next_sequence
+        self._next_sequence += 1
+        self._unacked.add(sequence)
+        self._buffer_record(APPEND, sequence, pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL))
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        self._schedule_flush()
+        return sequence, future
+
+    def ack(self, sequence):
+        if sequence not in self._unacked:
+            return
+        self._unacked.discard(sequence)
+        self._buffer_record(ACK, sequence, b'')
+        self._acks_since_checkpoint += 1
+        self._schedule_flush()
+
+    def _buffer_record(self, kind, sequence, payload):
+        self._buffer.append(_HEADER.pack(kind, len(payload), sequence, zlib.crc32(payload)))
+        self._buffer.append(payload)
+        self._buffered_bytes += _HEADER.size + len(payload)
+
+    def _schedule_flush(self):
+        if self._flush_task is not None and not self._flush_task.done():
+            return  # The running flush picks up whatever is buffered
+        loop = asyncio.get_running_loop()
+        if self._buffered_bytes >= self.max_group_bytes or self.commit_interval <= 0:
+            self._start_flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.commit_interval, self._start_flush)
+
+    def _start_flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush())
+
+    async def _flush(self):
+        while self._buffer:
+            group, waiters = self._buffer, self._waiters
+            self._buffer, self._waiters, self._buffered_bytes = [], [], 0
+            try:
+                await asyncio.to_thread(self._write, b''.join(group))
+            except Exception as e:
+                self.logger.error(f"WAL write failed: {str(e)}", exc_info=True)
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_exception(e)
+                continue
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_result(None)
+        if self._acks_since_checkpoint >= self.checkpoint_every:
+            await asyncio.to_thread(self.checkpoint, self.low_water())
+
+    def _write(self, data):
+        if self._segment is None or self._segment_bytes >= self.segment_size:
+            self._roll()
+        self._segment.write(data)
+        self._segment.flush()
+        if self.fsync:
+            os.fsync(self._segment.fileno())
+        self._segment_bytes += len(data)
+
+    def _roll(self):
+        if self._segment is not None:
+            self._segment.close()
+        # Named after the next sequence number, so every record in the earlier segments is below it
+        path = os.path.join(self.directory, f'{_SEGMENT_PREFIX}{self._next_sequence:020d}{_SEGMENT_SUFFIX}')
+        if os.path.exists(path):
+            path = os.path.join(self.directory, f'{_SEGMENT_PREFIX}{self._next_sequence:020d}-{self.id[:8]}{_SEGMENT_SUFFIX}')
+        self._segment = open(path, 'ab')
+        self._segment_bytes = 0
+
+    def low_water(self):
+        # Every record below this has been acknowledged
+        return min(self._unacked, default=self._next_sequence)
+
+    def checkpoint(self, low_water=None):
+        if low_water is None:
+            low_water = self.low_water()
+        temporary = os.path.join(self.directory, f'{_CHECKPOINT}.tmp')
+        with open(temporary, 'w') as checkpoint_file:
+            checkpoint_file.write(str(low_water))
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+        os.replace(temporary, os.path.join(self.directory, _CHECKPOINT))
+        self._acks_since_checkpoint = 0
+
+        segments = self._segments()
+        current = self._segment.name if self._segment is not None else None
+        for (first, path), (next_first, _) in zip(segments, segments[1:]):
+            if next_first <= low_water and path != current:
+                os.remove(path)
+        return low_water
+
+    async def close(self):
+        self._start_flush()
+        await self._flush_task
+        self.checkpoint()
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+
+    def __len__(self):
+        # Records not yet acknowledged
+        return len(self._unacked)
+
+    def __repr__(self):
+        return f'WriteAheadLog(directory={self.directory}, unacked={len(self)})'
@@ -0,0 +1,192 @@
+import os
+import json
+import sqlite3
+import logging
+from collections import deque
+
+# Pluggable chat history backends. Every backend appends a single message in
+# O(1) and reads lazily, so nothing has to json.load the whole history at
+# startup or json.dump it again after every message.
+
+class HistoryStore:
+    SUFFIX = ''
+
+    def append(self, message):
+        raise NotImplementedError
+
+    def tail(self, n):
+        raise NotImplementedError
+
+    def __iter__(self):
+        raise NotImplementedError
+
+    def compact(self):
+        pass
+
+    def close(self):
+        pass
+
+    def _import_legacy(self, legacy_file):
+        # One-time migration from the old single-file json format
+        if not legacy_file or not os.path.exists(legacy_file):
+            return
+        with open(legacy_file, 'r') as f:
+            messages = json.load(f)
+        for message in messages:
+            self.append(message)
+        os.replace(legacy_file, legacy_file + '.migrated')
+        logging.info(f'Migrated {len(messages)} messages from {legacy_file}')
+
+
+class JSONLHistoryStore(HistoryStore):
+    """Append-only log of JSON lines split into numbered segment files.
+
+    New messages go to the newest segment. Once a segment holds
+    segment_size messages a new one is started. Without max_items, closed
+    segments are never rewritten, so an append costs the same however long
+    the history gets. With max_items set, once there are more than
+    max_segments compact() keeps only the newest max_items messages.
+    """
+
+    def __init__(self, path, segment_size=None, max_segments=None, max_items=None, legacy_file=None):
+        self.path = path
+        # A bounded log only ever needs its live tail plus the segment being filled
+        self.segment_size = segment_size or max_items or 1000
+        self.max_segments = max_segments or 2
+        self.max_items = max_items
+        os.makedirs(path, exist_ok=True)
+        self._segments = sorted(
+            os.path.join(path, name) for name in os.listdir(path)
+            if name.startswith('segment-') and name.endswith('.jsonl')
+        )
+        self._active_count = None
+        if not self._segments:
+            self._import_legacy(legacy_file)
+
+    def _segment_path(self, index):
+        return os.path.join(self.path, f'segment-{index:08d}.jsonl')
+
+    def _segment_index(self, segment):
+        return int(os.path.basename(segment)[len('segment-'):-len('.jsonl')])
+
+    def _active_lines(self):
+        # Only the newest segment is ever counted, and only once
+        if self._active_count is None:
+            with open(self._segments[-1], 'r') as f:
+                self._active_count = sum(1 for _ in f)
+        return self._active_count
+
+    def _roll(self):
+        index = self._segment_index(self._segments[-1]) + 1 if self._segments else 0
+        self._segments.append(self._segment_path(index))
+        self._active_count = 0
+
+    def append(self, message):
+        if not self._segments or self._active_lines() >= self.segment_size:
+            self._roll()
+        with open(self._segments[-1], 'a') as f:
+            f.write(json.dumps(message) + '\n')
+        self._active_count += 1
+
+        if self.max_items is not None and len(self._segments) > self.max_segments:
+            self.compact()
+
+    def _read_segment(self, segment, lines=None):
+        with open(segment, 'r') as f:
+            for line in (f if lines is None else deque(f, maxlen=lines)):
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn write at the end of a segment after a crash
+                    logging.warning(f'Skipping corrupt line in {segment}')
+
+    def tail(self, n):
+        messages = deque()
+        for segment in reversed(self._segments):
+            if len(messages) >= n:
+                break
+            messages.extendleft(reversed(list(self._read_segment(segment, n - len(messages)))))
+        return list(messages)
+
+    def __iter__(self):
+        for segment in list(self._segments):
+            yield from self._read_segment(segment)
+
+    def compact(self):
+        # Unbounded logs keep their closed segments as they are; segments are
+        # only opened while being read, so there's nothing to gain by merging them
+        if self.max_items is None or len(self._segments) < 2:
+            return
+
+        # Keep only the newest max_items messages in a single segment
+        kept = self.tail(self.max_items)
+        target = self._segments[-1]
+        obsolete = self._segments[:-1]
+        tmp_path = target + '.tmp'
+        with open(tmp_path, 'w') as f:
+            for message in kept:
+                f.write(json.dumps(message) + '\n')
+        self._active_count = len(kept)
+        os.replace(tmp_path, target)
+        for segment in obsolete:
+            os.remove(segment)
+        self._segments = [segment for segment in self._segments if segment not in obsolete]
+        logging.info(f'Compacted {self.path} into {len(self._segments)} segment(s)')
+
+
+class SQLiteHistoryStore(HistoryStore):
+    """History kept in a SQLite table running in WAL mode."""
+
+    SUFFIX = '.db'
+
+    def __init__(self, path, max_items=None, compact_every=1000, legacy_file=None):
+        self.path = path
+        self.max_items = max_items
+        self.compact_every = compact_every
+        self._appends = 0
+        self._conn = sqlite3.connect(path)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS messages (seq INTEGER PRIMARY KEY AUTOINCREMENT, body TEXT NOT NULL)')
+        self._conn.commit()
+        if self._conn.execute('SELECT 1 FROM messages LIMIT 1').fetchone() is None:
+            self._import_legacy(legacy_file)
+
+    def append(self, message):
+        self._conn.execute('INSERT INTO messages (body) VALUES (?)', (json.dumps(message),))
+        self._conn.commit()
+        self._appends += 1
+        if self._appends % self.compact_every == 0:
+            self.compact()
+
+    def tail(self, n):
+        rows = self._conn.execute('SELECT body FROM messages ORDER BY seq DESC LIMIT ?', (n,)).fetchall()
+        return [json.loads(body) for (body,) in reversed(rows)]
+
+    def __iter__(self):
+        for (body,) in self._conn.execute('SELECT body FROM messages ORDER BY seq'):
+            yield json.loads(body)
+
+    def compact(self):
+        if self.max_items is not None:
+            self._conn.execute(
+                'DELETE FROM messages WHERE seq <= (SELECT MAX(seq) FROM messages) - ?',
+                (self.max_items,)
+            )
+            self._conn.commit()
+        self._conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    def close(self):
+        self._conn.close()
+
+
+HISTORY_BACKENDS = {
+    'jsonl': JSONLHistoryStore,
+    'sqlite': SQLiteHistoryStore,
+}
+
+def open_history_store(backend, name, **kwargs):
+    if backend not in HISTORY_BACKENDS:
+        raise ValueError(f"Unknown history backend '{backend}'. Expected one of {list(HISTORY_BACKENDS)}")
+    store_class = HISTORY_BACKENDS[backend]
+    return store_class(name + store_class.SUFFIX, **kwargs)
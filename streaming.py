@@ -0,0 +1,236 @@
+import re
+import json
+import time
+import asyncio
+import logging
+
+import discord
+
+# Discord caps message content at 2000 characters
+DISCORD_MESSAGE_LIMIT = 2000
+
+class StreamingFollowup:
+    """Shows a streamed completion in Discord as it is generated.
+
+    The first delta is sent as a followup straight away, so time to the
+    first visible token is one API round trip. After that, deltas are
+    coalesced into at most one edit per interval. Hitting a Discord rate
+    limit doubles the interval, and text over the message limit continues
+    in a new followup.
+    """
+
+    def __init__(self, interaction, header='', interval=0.75, max_interval=5.0, max_length=DISCORD_MESSAGE_LIMIT):
+        self.interaction = interaction
+        self.header = header
+        self.interval = interval
+        self.max_interval = max_interval
+        self.max_length = max_length
+        self.text = ''
+        self.first_token_latency = None
+        self._message = None  # The followup currently being edited
+        self._offset = 0  # Where the current followup's part of the text starts
+        self._sent = ''  # What the current followup shows right now
+        self._started = None
+        self._last_flush = 0.0
+
+    async def feed(self, deltas):
+        self._started = time.monotonic()
+        async for delta in deltas:
+            self.text += delta
+            # The first delta goes out at once, since nothing has been flushed yet
+            if time.monotonic() - self._last_flush >= self.interval:
+                await self._flush()
+        # The end of the stream must be shown, so keep retrying through rate limits
+        while not await self._flush():
+            await asyncio.sleep(max(0.0, self._last_flush + self.interval - time.monotonic()))
+        logging.info(f'Streamed {len(self.text)} characters, first token visible after {self.first_token_latency:.3f}s'
+                     if self.first_token_latency is not None else 'Stream finished without any content')
+        return self.text
+
+    async def _flush(self):
+        # Returns whether all of the text is now shown, False if rate limited
+        while True:
+            prefix = self.header if self._offset == 0 else ''
+            room = self.max_length - len(prefix)
+            part = self.text[self._offset:self._offset + room]
+            if not part:
+                return True
+            if not await self._show(prefix + part):
+                return False
+            if len(self.text) - self._offset <= room:
+                return True
+            # This followup is full, the rest goes in a new one
+            self._offset += room
+            self._message = None
+            self._sent = ''
+
+    async def _show(self, content):
+        if content == self._sent:
+            return True
+        try:
+            if self._message is None:
+                self._message = await self.interaction.followup.send(content, wait=True)
+                if self.first_token_latency is None:
+                    self.first_token_latency = time.monotonic() - self._started
+            else:
+                await self._message.edit(content=content)
+            self._sent = content
+            return True
+        except discord.HTTPException as e:
+            if e.status != 429:
+                raise
+            # Rate limited: back off and let the next flush pick up the text
+            self.interval = min(self.interval * 2, self.max_interval)
+            logging.warning(f'Rate limited while streaming, edit interval is now {self.interval:.2f}s')
+            return False
+        finally:
+            self._last_flush = time.monotonic()
+
+
+async def start_fake_openai_server(chunks, delay=0.05):
+    # Speaks just enough of the chat completions streaming protocol for openai to consume it
+    async def handle(reader, writer):
+        headers = await reader.readuntil(b'\r\n\r\n')
+        length = re.search(rb'content-length:\s*(\d+)', headers, re.IGNORECASE)
+        if length:
+            await reader.readexactly(int(length.group(1)))
+        writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nConnection: close\r\n\r\n')
+        for chunk in chunks:
+            data = {
+                'id': 'chatcmpl-fake',
+                'object': 'chat.completion.chunk',
+                'created': 0,
+                'model': 'gpt-3.5-turbo',
+                'choices': [{'index': 0, 'delta': {'content': chunk}, 'finish_reason': None}],
+            }
+            writer.write(f'data: {json.dumps(data)}\n\n'.encode())
+            await writer.drain()
+            await asyncio.sleep(delay)
+        writer.write(b'data: [DONE]\n\n')
+        await writer.drain()
+        writer.close()
+
+    return await asyncio.start_server(handle, '127.0.0.1', 0)
+
+
+class _FakeMessage:
+    def __init__(self, followup, content):
+        self.followup = followup
+        self.content = content
+
+    async def edit(self, content):
+        self.followup._check_rate_limit()
+        self.content = content
+        self.followup.edits.append((time.monotonic(), content))
+
+
+class _RateLimited:
+    # Enough of an aiohttp response for discord.HTTPException
+    status = 429
+    reason = 'Too Many Requests'
+
+
+class _FakeFollowup:
+    def __init__(self, rate_limited=0):
+        self.messages = []
+        self.edits = []
+        self.rate_limited = rate_limited  # How many of the next sends/edits get a 429
+        self.attempts = 0
+
+    def _check_rate_limit(self):
+        self.attempts += 1
+        if self.rate_limited:
+            self.rate_limited -= 1
+            raise discord.HTTPException(_RateLimited(), 'rate limited')
+
+    async def send(self, content, wait=False):
+        self._check_rate_limit()
+        message = _FakeMessage(self, content)
+        self.messages.append(message)
+        self.edits.append((time.monotonic(), content))
+        return message
+
+
+class _FakeInteraction:
+    def __init__(self, rate_limited=0):
+        self.followup = _FakeFollowup(rate_limited)
+
+
+def test_streaming():
+    import openai
+    from completion_client import AsyncCompletionClient
+
+    chunks = [f'word{i} ' for i in range(40)]
+    delay = 0.05
+
+    async def run():
+        server = await start_fake_openai_server(chunks, delay)
+        port = server.sockets[0].getsockname()[1]
+        openai.api_key = 'fake'
+        openai.api_base = f'http://127.0.0.1:{port}/v1'
+
+        interaction = _FakeInteraction()
+        client = AsyncCompletionClient(max_workers=1)
+        streamer = StreamingFollowup(interaction, header='Winfo: \n', interval=0.3, max_length=120)
+        start = time.monotonic()
+        text = await streamer.feed(client.stream([{'role': 'user', 'content': 'hi'}]))
+        total = time.monotonic() - start
+        await client.close()
+        server.close()
+        await server.wait_closed()
+        return interaction, streamer, text, total
+
+    interaction, streamer, text, total = asyncio.run(run())
+
+    assert text == ''.join(chunks)
+    # The full text is spread over followups that each respect the length limit
+    assert all(len(message.content) <= 120 for message in interaction.followup.messages)
+    assert ''.join(message.content for message in interaction.followup.messages) == 'Winfo: \n' + text
+    # The first token shows up long before the stream is finished
+    assert streamer.first_token_latency < total / 4
+    # Deltas are coalesced instead of costing one edit each
+    assert len(interaction.followup.edits) < len(chunks) / 2
+
+    print(f"Time to first visible token: {streamer.first_token_latency * 1000:.0f} ms of {total * 1000:.0f} ms total")
+    print(f"{len(chunks)} deltas shown with {len(interaction.followup.edits)} sends/edits over {len(interaction.followup.messages)} messages")
+
+def test_rate_limited_stream():
+    async def deltas(interaction):
+        yield 'Hello'
+        interaction.followup.rate_limited = 2  # Every send until the stream ends is rate limited
+        yield ', world'
+        yield '!'
+
+    async def run():
+        interaction = _FakeInteraction()
+        streamer = StreamingFollowup(interaction, interval=0.01)
+        text = await streamer.feed(deltas(interaction))
+        return interaction, streamer, text
+
+    interaction, streamer, text = asyncio.run(run())
+    assert text == 'Hello, world!'
+    # The final text is shown even though the last flushes were rate limited
+    assert [message.content for message in interaction.followup.messages] == ['Hello, world!']
+    assert streamer.interval == 0.04
+
+    # A rate-limited first send backs off too, rather than retrying on every delta
+    async def burst():
+        for _ in range(50):
+            yield 'x'
+
+    async def run_burst():
+        interaction = _FakeInteraction(rate_limited=3)
+        streamer = StreamingFollowup(interaction, interval=0.01)
+        text = await streamer.feed(burst())
+        return interaction, text
+
+    interaction, text = asyncio.run(run_burst())
+    assert [message.content for message in interaction.followup.messages] == [text]
+    # Three rate-limited sends and one that succeeds, not one per delta
+    assert interaction.followup.attempts == 4
+    print("Rate-limited streams still end with the full text shown")
+
+if __name__ == '__main__':
+    print("Testing StreamingFollowup against a local fake streaming server")
+    test_streaming()
+    test_rate_limited_stream()
@@ -1,4 +1,5 @@
 import os
+import asyncio
 import discord
 from discord import Intents, app_commands
 from dotenv import load_dotenv
@@ -6,121 +7,122 @@ import openai
 import logging
 from datetime import datetime
 import uuid
-import json
 from message_utils import format_message
+from conversation_store import ConversationStore
+from completion_client import AsyncCompletionClient, CompletionQueueFullError, ResponseCache
+from streaming import StreamingFollowup
 
 load_dotenv()
 
 DISCORD_TOKEN = os.getenv("DISCORD_TOKEN")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+HISTORY_BACKEND = os.getenv("HISTORY_BACKEND", "jsonl")  # 'jsonl' or 'sqlite'
+MESSAGE_QUE_LENGTH = 50
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 3000))
+MAX_HOT_CONVERSATIONS = int(os.getenv("MAX_HOT_CONVERSATIONS", 256))
+COMPLETION_WORKERS = int(os.getenv("COMPLETION_WORKERS", 4))
+COMPLETION_TIMEOUT = int(os.getenv("COMPLETION_TIMEOUT", 60))
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", 0))  # 0 disables the response cache
+STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "false").lower() == "true"  # Edit replies in place as they stream in
+STREAM_EDIT_INTERVAL_MS = int(os.getenv("STREAM_EDIT_INTERVAL_MS", 750))
 
 intents = discord.Intents.default()
 client = discord.Client(intents=intents)
 tree = app_commands.CommandTree(client)
 openai.api_key = OPENAI_API_KEY
+response_cache = ResponseCache(ttl=RESPONSE_CACHE_TTL, path='response_cache.db') if RESPONSE_CACHE_TTL else None
+completion_client = AsyncCompletionClient(model="gpt-3.5-turbo", max_workers=COMPLETION_WORKERS, timeout=COMPLETION_TIMEOUT, cache=response_cache)
 
 # Set up logging
 logging.basicConfig(filename='winfobot.log', level=logging.INFO,
                     format='%(asctime)s:%(levelname)s:%(message)s')
 
-# Global message queue and history
-message_que = []
-message_history = []
-
-# Load message history and queue from files
-def load_message_history():
-    try:
-        with open('message_history.json', 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return []
-
-def load_message_que():
-    try:
-        with open('message_que.json', 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return []
-
-message_history = load_message_history()
-message_que = load_message_que()
+# Conversation state is sharded by (guild, channel, user). Each conversation
+# has its own append-only history on disk and only the most recently used
+# ones keep their context window in memory.
+conversations = ConversationStore(
+    backend=HISTORY_BACKEND,
+    max_hot=MAX_HOT_CONVERSATIONS,
+    que_length=MESSAGE_QUE_LENGTH + 1,
+    token_budget=CONTEXT_TOKEN_BUDGET,
+    legacy_history='message_history.json',
+    legacy_que='message_que.json',
+)
 
 @client.event
 async def on_ready():
     print(f'We have logged in as {client.user}')
     logging.info(f'We have logged in as {client.user}')
+    completion_client.start()
     await tree.sync()  # Sync global slash commands
 
 @tree.command()
 @app_commands.describe(message='The message to chat with the bot')
 async def winfo(interaction: discord.Interaction, message: str):
-    global message_history, message_que
     try:
         await interaction.response.defer()  # Defer the initial response
         logging.info(f'Received message from {interaction.user.name} (ID: {interaction.user.id})')
 
-        # Create the message object and add it to the global queue
-        message_object = {
-            "message_id": str(uuid.uuid4()),
-            "user_id": interaction.user.id,
-            "username": interaction.user.name,
-            "role": "user",
-            "content": message,
-            "time": str(datetime.now())
-        }
-
-        message_history.append(message_object)
-
-        if len(message_que) > 50:
-            message_que.pop(0)
-
-        message_que.append(message_object)
-
-        logging.info(f'Added message to queue: {message_object}')
-
-        # Build the message context api array
-        message_context = []
-        for message in message_que:
-            api_message = {
-                "role": message['role'],
-                "content": message['content']
-            }
-            message_context.append(api_message)
-
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=message_context,
-        )
-
-        ai_response = response.choices[0].message['content']
-        logging.info(f'Response from OpenAI: {ai_response}')
-
-        # Build the response message object and add it to the message history
-        response_object = {
-            "message_id": str(uuid.uuid4()),
-            "user_id": interaction.user.id,
-            "username": interaction.user.name,
-            "role": "assistant",
-            "content": ai_response,
-            "time": str(datetime.now())
-        }
-
-        message_history.append(response_object)
-
-        logging.info(f'Added response to history: {response_object}')
-
-        # Write the updated message history and queue to their respective files
-        with open('message_history.json', 'w') as f:
-            json.dump(message_history, f)
-        with open('message_que.json', 'w') as f:
-            json.dump(message_que, f)
-
-        await interaction.followup.send(f"{interaction.user.name} said: \n{message['content']}\n\nWinfo: \n{ai_response}")  # Send the response
-        logging.info('Sent response to user')
-
-    except openai.error.RateLimitError:
+        conversation = conversations.get(interaction.guild_id, interaction.channel_id, interaction.user.id)
+
+        try:
+            # One request at a time per conversation so its history stays in order
+            async with conversation.lock:
+                # Create the message object and add it to the conversation's queue
+                message_object = {
+                    "message_id": str(uuid.uuid4()),
+                    "user_id": interaction.user.id,
+                    "username": interaction.user.name,
+                    "role": "user",
+                    "content": message,
+                    "time": str(datetime.now())
+                }
+
+                conversation.add_message(message_object)
+
+                logging.info(f'Added message to {conversation}: {message_object}')
+
+                # The context window keeps the API-format messages up to date as it goes
+                message_context = conversation.window.api_messages()
+
+                header = f"{interaction.user.name} said: \n{message}\n\nWinfo: \n"
+                if STREAM_RESPONSES:
+                    # Show the reply while it's generated instead of after it's finished
+                    followup = StreamingFollowup(interaction, header=header, interval=STREAM_EDIT_INTERVAL_MS / 1000)
+                    ai_response = await followup.feed(completion_client.stream(message_context, guild_id=interaction.guild_id))
+                else:
+                    response = await completion_client.complete(message_context, guild_id=interaction.guild_id)
+                    # Cached responses come back as plain dicts, so index rather than use attributes
+                    ai_response = response['choices'][0]['message']['content']
+                logging.info(f'Response from OpenAI: {ai_response}')
+                if response_cache:
+                    logging.info(f'Response cache stats: {response_cache.stats()}')
+
+                # Build the response message object and add it to the message history
+                response_object = {
+                    "message_id": str(uuid.uuid4()),
+                    "user_id": interaction.user.id,
+                    "username": interaction.user.name,
+                    "role": "assistant",
+                    "content": ai_response,
+                    "time": str(datetime.now())
+                }
+
+                conversation.add_message(response_object, context=False)
+
+                logging.info(f'Added response to history: {response_object}')
+
+                if not STREAM_RESPONSES:
+                    await interaction.followup.send(header + ai_response)  # Send the response
+                logging.info('Sent response to user')
+        finally:
+            conversations.release(conversation)
+    except (openai.error.RateLimitError, CompletionQueueFullError):
         await interaction.followup.send("The bot is currently busy. Please try again later.")
         logging.error("Rate limit error occurred.")
+    except asyncio.TimeoutError:
+        await interaction.followup.send("The bot took too long to respond. Please try again later.")
+        logging.error("Completion timed out.")
     except Exception as e:
         await interaction.followup.send(f"An unexpected error occurred: {type(e).__name__}, {e}")
         logging.error(f"An unexpected error occurred: {type(e).__name__}, {e}")